@@ -1,2 +1,8 @@
+from . import instrument
 from . import utils
 from . import io
+from . import cache
+from . import columnar
+from . import tail
+from . import schema
+from . import aio
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+import functools
+import multiprocessing
+from basicio import io
+from basicio import utils
+
+__all__ = ['file2recarray', 'getheaders', 'builddict', 'files2recarrays',
+           'setexecutor']
+
+# executor shared by all the calls which are not given one
+_executor = None
+
+
+def _asyncio():
+    """
+    returns the asyncio module, or its backport trollius in python 2
+    """
+    try:
+        import asyncio
+    except ImportError:
+        try:
+            import trollius as asyncio
+        except ImportError:
+            raise ImportError('The asynchronous functions require the '
+                              'asyncio module, or trollius in python 2')
+    return asyncio
+
+
+def _futures():
+    """
+    returns the concurrent.futures module, which is provided by the futures
+    backport in python 2
+    """
+    try:
+        import concurrent.futures
+    except ImportError:
+        raise ImportError('The asynchronous functions require the '
+                          'concurrent.futures module, or the futures '
+                          'backport in python 2')
+    return concurrent.futures
+
+
+def setexecutor(executor=None, maxworkers=None):
+    """
+    sets the executor in which the functions of this module run, unless they
+    are given one, and returns the executor previously set, if any. The
+    number of files read at the same time is bounded by the workers of the
+    executor, and further calls wait in its queue.
+
+
+    Parameters
+    ----------
+    executor: `concurrent.futures.Executor` , optional, defaults to `None`
+        executor to use. If `None` , a thread pool of maxworkers threads is
+        created. Since parsing is mostly CPU bound, the threads of this pool
+        keep the event loop free, but do not parse several files in parallel
+        under the global interpreter lock of python 2. A
+        `concurrent.futures.ProcessPoolExecutor` parses several files in
+        parallel, at the cost of sending the tables between processes.
+    maxworkers: int, optional, defaults to `None`
+        number of threads of the thread pool created if executor is `None` ,
+        defaulting to the number of CPUs
+
+
+    Returns
+    -------
+    The previous executor, or `None`
+
+
+    Examples
+    --------
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> executor = ThreadPoolExecutor(2)
+    >>> previous = setexecutor(executor)
+    >>> setexecutor(previous) is executor
+    True
+    >>> executor.shutdown()
+    """
+    global _executor
+    if executor is None:
+        if maxworkers is None:
+            maxworkers = multiprocessing.cpu_count()
+        executor = _futures().ThreadPoolExecutor(maxworkers)
+    previous = _executor
+    _executor = executor
+    return previous
+
+
+def _submit(func, args, kwargs, loop=None, executor=None):
+    """
+    returns an asyncio future of the result of func called with args and
+    kwargs in executor, or the executor set by `setexecutor`
+    """
+    asyncio = _asyncio()
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    if executor is None:
+        if _executor is None:
+            setexecutor()
+        executor = _executor
+    return loop.run_in_executor(executor,
+                                functools.partial(func, *args, **kwargs))
+
+
+def file2recarray(file, loop=None, executor=None, **kwargs):
+    """
+    returns an asyncio future of the table read by `basicio.io.file2recarray`
+    from file with the keyword arguments kwargs, which is read in an
+    executor so that the event loop is not blocked. Cancelling the future
+    before the executor starts reading the file means it is never read. Once
+    reading has started, it runs to completion and the table is dropped.
+
+
+    Parameters
+    ----------
+    file: string or buffer, mandatory
+        absolute path to file containing the data, or a string or buffer
+        containing the data if buffer is True
+    loop: event loop, optional, defaults to `None`
+        event loop of the future, or the current event loop if `None`
+    executor: `concurrent.futures.Executor` , optional, defaults to `None`
+        executor reading the file, or the one set by `setexecutor` if `None`
+    kwargs:
+        keyword arguments of `basicio.io.file2recarray`
+
+
+    Returns
+    -------
+    `asyncio.Future` of the `np.recarray` or structured array
+
+
+    Examples
+    --------
+    >>> import os
+    >>> fname = os.path.join(io._here, 'example_data/singleheader_data.dat')
+    >>> loop = _asyncio().new_event_loop()
+    >>> loop.run_until_complete(file2recarray(fname, loop=loop,
+    ...                                       headerstring='#'))
+    array([(23, 1. , 45.), (12, 0.6, 41.)],
+          dtype=[('SNID', '<i8'), ('z', '<f4'), ('mu', '<f4')])
+    >>> loop.close()
+
+    In python 3, the future is awaited in a coroutine:
+
+    >>> async def load():  # doctest: +SKIP
+    ...     return await file2recarray(fname, headerstring='#')
+    """
+    return _submit(io.file2recarray, (file,), kwargs, loop=loop,
+                   executor=executor)
+
+
+def getheaders(fname, headerstring, loop=None, executor=None, **kwargs):
+    """
+    returns an asyncio future of the variable names read by
+    `basicio.io.getheaders` from the file fname, with headerstring and the
+    keyword arguments kwargs of `basicio.io.getheaders` . loop and executor
+    are as in `file2recarray` .
+    """
+    return _submit(io.getheaders, (fname, headerstring), kwargs, loop=loop,
+                   executor=executor)
+
+
+def builddict(fname, loop=None, executor=None, **kwargs):
+    """
+    returns an asyncio future of the dictionary built by
+    `basicio.utils.builddict` from the file fname, with the keyword arguments
+    kwargs of `basicio.utils.builddict` . loop and executor are as in
+    `file2recarray` .
+    """
+    return _submit(utils.builddict, (fname,), kwargs, loop=loop,
+                   executor=executor)
+
+
+def files2recarrays(files, loop=None, executor=None, **kwargs):
+    """
+    returns an asyncio future of the list of the tables read by
+    `basicio.io.file2recarray` from each of the files with the keyword
+    arguments kwargs. At most as many files as the executor has workers are
+    read at a time. Cancelling the future cancels the reading of the files
+    that have not started. loop and executor are as in `file2recarray` .
+
+
+    Examples
+    --------
+    >>> import os
+    >>> fnames = [os.path.join(io._here, 'example_data/table_data.dat')] * 4
+    >>> loop = _asyncio().new_event_loop()
+    >>> future = files2recarrays(fnames, loop=loop, sample=10)
+    >>> [len(table) for table in loop.run_until_complete(future)]
+    [96, 96, 96, 96]
+    >>> loop.run_until_complete(files2recarrays([], loop=loop))
+    []
+    >>> loop.close()
+    """
+    asyncio = _asyncio()
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    return asyncio.gather(*[file2recarray(fname, loop=loop,
+                                          executor=executor, **kwargs)
+                            for fname in files], loop=loop)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+import numpy as np
+import hashlib
+import os
+import tempfile
+
+__all__ = ['TableCache']
+
+
+def _filehash(fname, blocksize=2 ** 20):
+    """
+    returns the sha1 hex digest of the contents of the file fname
+    """
+    h = hashlib.sha1()
+    with open(fname, 'rb') as fp:
+        block = fp.read(blocksize)
+        while block:
+            h.update(block)
+            block = fp.read(blocksize)
+    return h.hexdigest()
+
+
+class TableCache(object):
+    """
+    A directory of parsed tables stored as `.npy` files, so that a table
+    read from an unchanged file with the same arguments is loaded as a memory
+    map rather than parsed again. The cache is bounded in size, and the least
+    recently used tables are evicted first.
+
+
+    Parameters
+    ----------
+    directory: string, mandatory
+        absolute path to the directory holding the cached tables, which is
+        created if it does not exist
+    maxbytes: int, optional, defaults to 2 ** 30
+        maximal total size in bytes of the cached tables
+    hashcontents: bool, optional, defaults to False
+        if True, the key of a file includes a hash of its contents, in
+        addition to its path, size and modification time. This costs a read
+        of the file for every lookup.
+
+
+    Examples
+    --------
+    >>> import shutil
+    >>> from basicio import io
+    >>> fname = os.path.join(io._here, 'example_data/table_data.dat')
+    >>> cachedir = tempfile.mkdtemp()
+    >>> cache = TableCache(cachedir)
+    >>> key = cache.key(fname, datastring=None)
+    >>> cache.get(key) is None
+    True
+    >>> x = io.file2recarray(fname)
+    >>> cache.put(key, x)
+    >>> y = cache.get(key)
+    >>> isinstance(y, np.memmap)
+    True
+    >>> (x == y).all()
+    True
+    >>> key == cache.key(fname, datastring='SN:')
+    False
+    >>> with open(cache._path(key), 'r+b') as fp:
+    ...     fp.truncate(100)
+    >>> cache.get(key) is None
+    True
+    >>> os.path.exists(cache._path(key))
+    False
+    >>> shutil.rmtree(cachedir)
+    """
+    def __init__(self, directory, maxbytes=2 ** 30, hashcontents=False):
+        self.directory = directory
+        self.maxbytes = maxbytes
+        self.hashcontents = hashcontents
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, fname, **kwargs):
+        """
+        returns the key of the table parsed from the file fname with the
+        keyword arguments kwargs, built from the path, size and modification
+        time of the file, the hash of its contents if hashcontents is True,
+        and the arguments.
+        """
+        stat = os.stat(fname)
+        items = [os.path.realpath(fname), stat.st_size, stat.st_mtime]
+        if self.hashcontents:
+            items.append(_filehash(fname))
+        items.append(sorted(kwargs.items()))
+        return hashlib.sha1(repr(items)).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        """
+        returns the table cached with key as a read only `np.memmap`, or
+        `None` if there is no such table. A table which cannot be loaded, eg.
+        because its file was truncated, is removed and `None` is returned.
+        """
+        path = self._path(key)
+        try:
+            arr = np.load(path, mmap_mode='r')
+        except IOError:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        except ValueError:
+            os.remove(path)
+            return None
+        # Mark the table as recently used
+        os.utime(path, None)
+        return arr
+
+    def put(self, key, arr):
+        """
+        stores the structured array arr in the cache with key, and evicts the
+        least recently used tables if the cache is larger than maxbytes
+        """
+        # Write to a temporary file first so that readers never see a
+        # partially written table
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            np.save(fp, arr)
+        os.rename(tmppath, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        removes the least recently used tables until the total size of the
+        cache is at most maxbytes
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            if not fname.endswith('.npy'):
+                continue
+            path = os.path.join(self.directory, fname)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxbytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        removes all the tables in the cache
+        """
+        for fname in os.listdir(self.directory):
+            if fname.endswith('.npy'):
+                os.remove(os.path.join(self.directory, fname))
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+import numpy as np
+import collections
+import contextlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from basicio import io
+from basicio import utils
+
+__all__ = ['recarray2columnar', 'file2columnar', 'loadcolumnar',
+           'columnarschema']
+
+# name of the file holding the schema of a columnar table
+_schemafile = 'schema.json'
+
+
+def _columnfile(i):
+    """
+    returns the name of the file holding the column i of a columnar table
+    """
+    return 'column{}.bin'.format(i)
+
+
+def _writeschema(directory, names, dtypes, numrows, header=None):
+    """
+    writes the schema of the columnar table in directory, after its columns,
+    so that a table without a schema is known to be incomplete
+    """
+    schema = dict(names=names, dtypes=[np.dtype(t).str for t in dtypes],
+                  files=[_columnfile(i) for i in range(len(names))],
+                  numrows=numrows, header=header)
+    tmppath = os.path.join(directory, _schemafile + '.tmp')
+    with open(tmppath, 'w') as fp:
+        json.dump(schema, fp, indent=1)
+    os.rename(tmppath, os.path.join(directory, _schemafile))
+
+
+@contextlib.contextmanager
+def _prepare(directory):
+    """
+    context manager creating the directory of a columnar table if it does not
+    exist, and yielding a temporary directory within it in which the columns
+    of the table are written. Once they are, the schema of a table
+    previously stored in directory is removed, and the columns are moved
+    into directory. The temporary directory is removed even if writing the
+    columns fails, so that a table previously stored is then kept.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmpdir = tempfile.mkdtemp(dir=directory, prefix='.tmp')
+    try:
+        yield tmpdir
+        path = os.path.join(directory, _schemafile)
+        if os.path.exists(path):
+            os.remove(path)
+        for fname in os.listdir(tmpdir):
+            os.rename(os.path.join(tmpdir, fname),
+                      os.path.join(directory, fname))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def recarray2columnar(recarray, directory, header=None):
+    """
+    stores a structured array, or a dictionary of columns, as a columnar
+    table: a directory holding the raw bytes of each column in a file of its
+    own, and a JSON schema of the names and types of the columns, the number
+    of rows and the header of the source of the table.
+
+
+    Parameters
+    ----------
+    recarray: `np.recarray` , structured array or dictionary, mandatory
+        table to store, or ordered dictionary of 1D arrays of the same length
+        by name, as returned by the readers with output 'columns'
+    directory: string, mandatory
+        absolute path to the directory of the columnar table, which is
+        created if it does not exist
+    header: list of strings, optional, defaults to `None`
+        lines of the header of the source of the table, kept in the schema
+
+
+    Examples
+    --------
+    >>> import tempfile, shutil
+    >>> fname = os.path.join(io._here, 'example_data/table_data.dat')
+    >>> x = io.file2recarray(fname)
+    >>> directory = tempfile.mkdtemp()
+    >>> recarray2columnar(x, directory)
+    >>> y = loadcolumnar(directory)
+    >>> all((y[name] == x[name]).all() for name in x.dtype.names)
+    True
+    >>> shutil.rmtree(directory)
+    """
+    if isinstance(recarray, dict):
+        names = list(recarray.keys())
+        columns = [np.asarray(recarray[name]) for name in names]
+    else:
+        names = list(recarray.dtype.names)
+        columns = [recarray[name] for name in names]
+    with _prepare(directory) as tmpdir:
+        for i, col in enumerate(columns):
+            # fields of structured arrays are strided, and are copied a chunk
+            # at a time
+            with open(os.path.join(tmpdir, _columnfile(i)), 'wb') as fp:
+                for start in range(0, len(col), io._chunksize):
+                    chunk = col[start:start + io._chunksize]
+                    np.ascontiguousarray(chunk).tofile(fp)
+    numrows = len(columns[0]) if len(columns) > 0 else 0
+    _writeschema(directory, names, [col.dtype for col in columns], numrows,
+                 header=header)
+
+
+def _sourceheader(file, buffer=False, delimiter='', datastring=None,
+                  ignorestring=None, headerstring=None):
+    """
+    returns the list of the lines of a file or buffer preceding its first
+    line of data which are not blank, without trailing whitespace
+    """
+    header = []
+    with contextlib.closing(io._openfile(file, buffer=buffer)) as fp:
+        for line in fp:
+            lst = io._linetokens(line, delimitter=delimiter,
+                                 datastring=datastring,
+                                 ignorestring=ignorestring,
+                                 headerstring=headerstring)
+            if len(lst) > 0:
+                break
+            if line.strip():
+                header.append(line.rstrip())
+    return header
+
+
+def _guessedtypes(file, chunksize=io._chunksize, names=None, delimiter='',
+                  headerstring=None, ignorestring=None, datastring=None,
+                  buffer=False, usecols=None):
+    """
+    returns the types of the columns of the tabular data in a file or
+    buffer, read as by `basicio.io.iter_file2recarray` , guessed from all
+    the rows a chunk at a time, or `None` if there are no lines of data
+    """
+    headers = []
+    types = None
+    with contextlib.closing(io._openfile(file, buffer=buffer)) as fp:
+        tokens = io._datatokens(fp, delimitter=delimiter,
+                                datastring=datastring,
+                                ignorestring=ignorestring,
+                                headerstring=headerstring, headers=headers)
+        first = next(tokens, None)
+        if first is None:
+            return None
+        tokens = itertools.chain([first], tokens)
+        names, usecols = io._selectnames(headers, names, usecols)
+        for block in io._columnblocks(tokens, chunksize=chunksize,
+                                      usecols=usecols):
+            guessed = [utils.guessarraytype(col) for col in block]
+            if types is not None:
+                guessed = [utils.promotetypes([t, g])
+                           for t, g in zip(types, guessed)]
+            types = guessed
+    return types
+
+
+def file2columnar(file, directory, chunksize=io._chunksize, types=None,
+                  names=None, delimiter='', headerstring=None,
+                  ignorestring=None, datastring=None, buffer=False,
+                  usecols=None, rowfilter=None):
+    """
+    converts the tabular data in a file or buffer into a columnar table, as
+    stored by `recarray2columnar` , reading it a chunk of rows at a time so
+    that tables larger than the available memory can be converted. The lines
+    of the file preceding the data are kept as the header in the schema. A
+    table previously stored in directory is only replaced once the
+    conversion succeeds.
+
+
+    Parameters
+    ----------
+    file: string or buffer, mandatory
+        absolute path to file containing the data, or a string or buffer
+        containing the data if buffer is True
+    directory: string, mandatory
+        absolute path to the directory of the columnar table, which is
+        created if it does not exist
+    chunksize: int, optional, defaults to 65536
+        maximal number of rows read at a time
+    types, names, delimiter, headerstring, ignorestring, datastring, buffer,
+    usecols, rowfilter: optional
+        as in `basicio.io.iter_file2recarray` . Unless types are supplied,
+        they are guessed from all the rows, as by `basicio.io.file2recarray`
+        , in a first pass over the data, which is then read again.
+
+
+    Examples
+    --------
+    >>> import tempfile, shutil
+    >>> fname = os.path.join(io._here, 'example_data/singleheader_data.dat')
+    >>> directory = tempfile.mkdtemp()
+    >>> file2columnar(fname, directory, headerstring='#', chunksize=1)
+    >>> schema = columnarschema(directory)
+    >>> schema['names'], schema['numrows'], schema['header']
+    (['SNID', 'z', 'mu'], 2, ['# SNID z mu'])
+    >>> loadcolumnar(directory, usecols=['mu'])
+    OrderedDict([('mu', memmap([45., 41.], dtype=float32))])
+    >>> buf = '6773 0.5\\n03D1ba 0.7\\n'
+    >>> file2columnar(buf, directory, buffer=True, chunksize=1)
+    >>> loadcolumnar(directory)['f0']
+    memmap(['6773', '03D1ba'], dtype='|S20')
+    >>> file2columnar(buf, directory, buffer=True, types=['i8', 'f4'])
+    Traceback (most recent call last):
+        ...
+    ValueError: Strings in the array cannot be converted to i8
+    >>> columnarschema(directory)['numrows']
+    2
+    >>> shutil.rmtree(directory)
+    """
+    if types is None:
+        types = _guessedtypes(file, chunksize=chunksize, names=names,
+                              delimiter=delimiter, headerstring=headerstring,
+                              ignorestring=ignorestring,
+                              datastring=datastring, buffer=buffer,
+                              usecols=usecols)
+    header = _sourceheader(file, buffer=buffer, delimiter=delimiter,
+                           datastring=datastring, ignorestring=ignorestring,
+                           headerstring=headerstring)
+    chunks = io.iter_file2recarray(file, chunksize=chunksize, types=types,
+                                   names=names, delimiter=delimiter,
+                                   headerstring=headerstring,
+                                   ignorestring=ignorestring,
+                                   datastring=datastring, buffer=buffer,
+                                   usecols=usecols, rowfilter=rowfilter,
+                                   output='columns')
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError('No lines of data were found')
+    names = list(first.keys())
+    dtypes = [col.dtype for col in first.values()]
+    numrows = 0
+    with _prepare(directory) as tmpdir:
+        files = [open(os.path.join(tmpdir, _columnfile(i)), 'wb')
+                 for i in range(len(names))]
+        try:
+            for chunk in itertools.chain([first], chunks):
+                for fp, col in zip(files, chunk.values()):
+                    col.tofile(fp)
+                numrows += len(chunk[names[0]])
+        finally:
+            for fp in files:
+                fp.close()
+    _writeschema(directory, names, dtypes, numrows, header=header)
+
+
+def columnarschema(directory):
+    """
+    returns the schema of the columnar table in directory, as a dictionary of
+    the lists of the 'names' , 'dtypes' and 'files' of the columns, the
+    number of rows 'numrows' , and the lines of the 'header' of its source
+    """
+    path = os.path.join(directory, _schemafile)
+    if not os.path.exists(path):
+        raise ValueError('There is no columnar table in {}'.format(directory))
+    with open(path) as fp:
+        schema = json.load(fp)
+
+    # json gives unicode strings
+    for key in ('names', 'dtypes', 'files'):
+        schema[key] = [str(value) for value in schema[key]]
+    if schema['header'] is not None:
+        schema['header'] = [line.encode('utf-8') for line in schema['header']]
+    return schema
+
+
+def loadcolumnar(directory, usecols=None):
+    """
+    loads the columns of a columnar table as read only memory maps, so that
+    only the columns requested are opened, and only the parts of them which
+    are used are read from disk
+
+
+    Parameters
+    ----------
+    directory: string, mandatory
+        absolute path to the directory of the columnar table
+    usecols: list of ints or strings, optional, defaults to `None`
+        if not `None` , the only columns loaded, given by their indices or
+        names, in the order in which they are returned
+
+
+    Returns
+    -------
+    `collections.OrderedDict` of `np.memmap` by name
+
+
+    Examples
+    --------
+    >>> import tempfile, shutil
+    >>> fname = os.path.join(io._here, 'example_data/table_data.dat')
+    >>> directory = tempfile.mkdtemp()
+    >>> file2columnar(fname, directory)
+    >>> columns = loadcolumnar(directory, usecols=[9, 'f0'])
+    >>> columns.keys()
+    ['f9', 'f0']
+    >>> x = io.file2recarray(fname, usecols=[9, 0])
+    >>> (columns['f9'] == x['f0']).all() and (columns['f0'] == x['f1']).all()
+    True
+    >>> shutil.rmtree(directory)
+    """
+    schema = columnarschema(directory)
+    names = schema['names']
+    indices = range(len(names))
+    if usecols is not None:
+        indices = io._resolveusecols(usecols, names)
+    columns = collections.OrderedDict()
+    for i in indices:
+        dtype = np.dtype(schema['dtypes'][i])
+        if schema['numrows'] == 0:
+            # empty files cannot be memory mapped
+            columns[names[i]] = np.empty(0, dtype=dtype)
+            continue
+        columns[names[i]] = np.memmap(os.path.join(directory,
+                                                   schema['files'][i]),
+                                      dtype=dtype, mode='r',
+                                      shape=(schema['numrows'],))
+    return columns
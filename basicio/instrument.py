@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+import contextlib
+import sys
+import time
+
+__all__ = ['collect', 'LoadStats', 'addcallback', 'removecallback']
+
+# statistics being collected, innermost last
+_collecting = []
+
+# functions called with the statistics of every collection when it ends
+_callbacks = []
+
+# phases of reading a table, in order
+_phases = ('read', 'filter', 'tokenize', 'assemble', 'infer', 'convert')
+
+# counters of the data read
+_counters = ('bytes', 'lines', 'keptlines', 'rows')
+
+
+def _peakmemory():
+    """
+    returns the peak resident memory of the process in bytes, or `None` on
+    platforms without the resource module, such as Windows
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
+class LoadStats(object):
+    """
+    statistics of the tables read while they are collected by `collect`
+
+
+    Attributes
+    ----------
+    times: dictionary
+        wall time in seconds spent in each phase: 'read' (reading lines from
+        the file, including decompression), 'filter' (selecting the lines of
+        data), 'tokenize' (splitting lines into tokens), 'assemble' (building
+        columns from rows of tokens and allocating tables), 'infer'
+        (guessing types) and 'convert' (converting strings to types)
+    counts: dictionary
+        number of 'bytes' read, of 'lines' read, of lines kept as data
+        ('keptlines') and of 'rows' in the tables returned
+    elapsed: float
+        wall time in seconds of the collection
+    peakmemory: int
+        peak resident memory of the process in bytes at the end of the
+        collection, or `None` if it cannot be measured on the platform
+    peakincrease: int
+        increase in bytes of the peak resident memory of the process during
+        the collection, which is 0 if the process used more memory before,
+        or `None` if it cannot be measured on the platform
+    """
+    def __init__(self):
+        self.times = dict((name, 0.) for name in _phases)
+        self.counts = dict((name, 0) for name in _counters)
+        self.elapsed = 0.
+        self.peakmemory = None
+        self.peakincrease = None
+
+        # phases being timed, innermost last, and when they were last resumed
+        self._running = []
+
+    def _enter(self, name, now):
+        """
+        starts timing the phase name, pausing the phase being timed
+        """
+        if len(self._running) > 0:
+            outer, since = self._running[-1]
+            self.times[outer] += now - since
+        self._running.append((name, now))
+
+    def _exit(self, now):
+        """
+        stops timing the innermost phase, resuming the phase it paused
+        """
+        name, since = self._running.pop()
+        self.times[name] += now - since
+        if len(self._running) > 0:
+            self._running[-1] = (self._running[-1][0], now)
+
+    @property
+    def rowspersecond(self):
+        """
+        rows of the tables returned per second of the collection
+        """
+        if self.elapsed == 0:
+            return 0.
+        return self.counts['rows'] / self.elapsed
+
+    def report(self):
+        """
+        returns a summary of the statistics as a string
+        """
+        lines = ['{:<10s} {:10.4f} s'.format(name, self.times[name])
+                 for name in _phases]
+        lines.append('{:<10s} {:10.4f} s'.format('elapsed', self.elapsed))
+        lines += ['{:<10s} {:10d}'.format(name, self.counts[name])
+                  for name in _counters]
+        lines.append('{:<10s} {:10.1f}'.format('rows/s', self.rowspersecond))
+        if self.peakmemory is not None:
+            lines.append('{:<10s} {:10d} bytes (+{})'.format(
+                'peak', self.peakmemory, self.peakincrease))
+        return '\n'.join(lines)
+
+
+def collecting():
+    """
+    returns True if statistics are being collected
+    """
+    return len(_collecting) > 0
+
+
+@contextlib.contextmanager
+def collect(callback=None):
+    """
+    context manager collecting the statistics of the tables read by
+    `basicio.io` and `basicio.utils` in its block, in the current process,
+    as a `LoadStats` . When the block ends, callback, if not `None` , and the
+    functions registered with `addcallback` are called with the statistics.
+    Lines are only timed one at a time while statistics are collected.
+
+
+    Examples
+    --------
+    >>> import os
+    >>> from basicio import io
+    >>> fname = os.path.join(io._here, 'example_data/table_data.dat')
+    >>> with collect() as stats:
+    ...     x = io.file2recarray(fname)
+    >>> stats.counts['rows'], stats.counts['lines']
+    (96, 96)
+    >>> stats.times['tokenize'] > 0 and stats.rowspersecond > 0
+    True
+    >>> print stats.report() # doctest: +ELLIPSIS
+    read ...
+    """
+    stats = LoadStats()
+    before = _peakmemory()
+    start = time.time()
+    _collecting.append(stats)
+    try:
+        yield stats
+    finally:
+        _collecting.remove(stats)
+        stats.elapsed = time.time() - start
+        stats.peakmemory = _peakmemory()
+        if stats.peakmemory is not None:
+            stats.peakincrease = stats.peakmemory - before
+        for func in _callbacks + [callback]:
+            if func is not None:
+                func(stats)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    context manager adding the wall time of its block to the phase name of
+    the statistics being collected. The time of phases within the block is
+    only added to those phases.
+    """
+    timed = list(_collecting)
+    if len(timed) == 0:
+        yield
+        return
+    now = time.time()
+    for stats in timed:
+        stats._enter(name, now)
+    try:
+        yield
+    finally:
+        now = time.time()
+        for stats in timed:
+            stats._exit(now)
+
+
+def add(times=None, counts=None):
+    """
+    adds the dictionaries of times by phase and of counts by counter to the
+    statistics being collected
+    """
+    for stats in _collecting:
+        if times is not None:
+            for name, value in times.iteritems():
+                stats.times[name] += value
+        if counts is not None:
+            for name, value in counts.iteritems():
+                stats.counts[name] += value
+
+
+def addcallback(func):
+    """
+    registers the function func, which is called with the `LoadStats` of
+    every collection when it ends
+    """
+    _callbacks.append(func)
+
+
+def removecallback(func):
+    """
+    removes the function func from the functions registered by `addcallback`
+    """
+    _callbacks.remove(func)
@@ -2,17 +2,269 @@
 
 import numpy as np
 import os.path
+import bz2
+import collections
+import contextlib
 import cStringIO
+import glob
+import gzip
+import itertools
+import mmap
+import operator
 import string
+import zlib
+from basicio import instrument
 from basicio import utils
+from basicio.cache import TableCache
 import os, sys
+import time
 
 _here = os.path.dirname(os.path.realpath(__file__))
 
-__all__ = ['file2recarray', 'strarray2recarray', 'file2strarray', 'getheaders', 'arraydtypes'] 
+__all__ = ['file2recarray', 'strarray2recarray', 'file2strarray', 'getheaders',
+           'arraydtypes', 'iter_file2recarray', 'buildlineindex',
+           'loadlineindex', 'read_rows', 'read_slice', 'files2recarray',
+           'recarray2file']
+
+_chunksize = 65536
+
+# rows tokenized at a time by `file2recarray` , whose lists of tokens are
+# held as Python objects until they are grouped into columns
+_batchsize = 8192
+
+# formats of the tables returned by the readers
+_outputs = ('recarray', 'columns')
+
+
+# magic bytes at the start of compressed files
+_magic = [('\x1f\x8b', 'gz'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz')]
+
+
+def _compression(header):
+    """
+    returns the compression ('gz', 'bz2' or 'xz') of data starting with the
+    string header, or `None` if the data is not compressed
+    """
+    for magic, compression in _magic:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def _filecompression(fname):
+    """
+    returns the compression of the file fname, as given by `_compression`
+    """
+    with open(fname, 'rb') as fp:
+        return _compression(fp.read(6))
+
+
+def _lzma():
+    """
+    returns the lzma module, or its backport in python 2
+    """
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            raise ImportError('xz compressed data requires the lzma module, '
+                              'or backports.lzma in python 2')
+    return lzma
+
+
+def _decompressor(compression):
+    """
+    returns a decompressor object for a stream of data with compression
+    """
+    if compression == 'gz':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bz2':
+        return bz2.BZ2Decompressor()
+    return _lzma().LZMADecompressor()
+
+
+def _decompressedlines(fp, compression, blocksize=2 ** 20):
+    """
+    generator yielding the lines of the compressed data read from the open
+    file fp a block at a time, which is closed when the generator is
+    exhausted or closed. Concatenated compressed streams are read in turn.
+    """
+    try:
+        decompressor = _decompressor(compression)
+        tail = ''
+        data = fp.read(blocksize)
+        while data:
+            try:
+                text = decompressor.decompress(data)
+            except EOFError:
+                # the previous stream has ended, and another one follows
+                decompressor = _decompressor(compression)
+                continue
+            data = decompressor.unused_data
+            if data:
+                decompressor = _decompressor(compression)
+            else:
+                data = fp.read(blocksize)
+            lines = (tail + text).split('\n')
+            tail = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if tail:
+            yield tail
+    finally:
+        fp.close()
+
+
+def _openfile(file, buffer=False):
+    """
+    returns an open file object for file, which may be the path to a file or,
+    if buffer is True, a string or an object supporting the buffer protocol,
+    such as a `bytearray` , `mmap.mmap` or `memoryview` , containing the
+    data. The data of buffers is read in place rather than copied. Data
+    compressed with gzip, bzip2 or xz is recognized by its first bytes, and
+    the returned object is then an iterator over the lines of the
+    decompressed data with a close method.
+    """
+    # Check if this is a path to a file or a string (compressed data may
+    # have null bytes, which os.path.isfile does not accept)
+    if (isinstance(file, basestring) and '\x00' not in file and
+            os.path.isfile(file)):
+        fp = open(file, 'rb')
+    else:
+        # this is a string, Check if buffer is true
+        if not buffer:
+            raise ValueError('The file does not exist, and buffer is False,\
+                             so cannot iterpret as data stream')
+        # cStringIO reads from the memory of strings and buffers
+        fp = cStringIO.StringIO(file)
+    compression = _compression(fp.read(6))
+    fp.seek(0)
+    if compression is None:
+        return fp
+    return _decompressedlines(fp, compression)
+
+
+def _linetokens(line, delimitter='', datastring=None, ignorestring=None,
+                headerstring=None, headers=None):
+    """
+    returns the list of tokens of a line of data following the rules of
+    `file2strarray` , or an empty list if the line does not contain data. If
+    headerstring is not None, lines starting with headerstring are not data,
+    and if headers is a list, the variable names on each such line are
+    appended to it as a list.
+    """
+    line = _dataline(line, datastring=datastring, ignorestring=ignorestring,
+                     headerstring=headerstring, headers=headers)
+    if line is None:
+        return []
+    return _tokens(line, delimitter=delimitter, datastring=datastring,
+                   ignorestring=ignorestring)
+
+
+def _dataline(line, datastring=None, ignorestring=None, headerstring=None,
+              headers=None):
+    """
+    returns the stripped line if it may contain data following the rules of
+    `_linetokens` , and `None` otherwise, appending the names on header lines
+    to headers if it is a list
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if headerstring is not None and line.startswith(headerstring):
+        if headers is not None:
+            headers.append(_headertokens(line, headerstring,
+                                         ignorestring=ignorestring))
+        return None
+    if datastring is not None and not line.startswith(datastring):
+        return None
+    return line
+
+
+def _tokens(line, delimitter='', datastring=None, ignorestring=None):
+    """
+    returns the list of tokens of a stripped line selected by `_dataline`
+    """
+    if datastring is None:
+        if ignorestring is None:
+            return utils.tokenizeline(line, delimitter=delimitter)[0]
+        return utils.tokenizeline(line, delimitter=delimitter,
+                                  ignorestrings=ignorestring)[0]
+    return utils.tokenizeline(line, delimitter=delimitter,
+                              prependstring=datastring,
+                              ignorestrings=ignorestring)[0]
+
+
+def _datatokens(fp, delimitter='', datastring=None, ignorestring=None,
+                headerstring=None, headers=None):
+    """
+    returns a generator yielding the list of tokens of each line of data in
+    the open file fp, following the rules of `_linetokens` . Header lines are
+    appended to headers as they are read. If statistics are being collected
+    by `basicio.instrument.collect` , the lines are timed one at a time.
+    """
+    kwargs = dict(delimitter=delimitter, datastring=datastring,
+                  ignorestring=ignorestring, headerstring=headerstring,
+                  headers=headers)
+    if instrument.collecting():
+        return _timedtokens(fp, **kwargs)
+    return _plaintokens(fp, **kwargs)
+
+
+def _plaintokens(fp, delimitter='', datastring=None, ignorestring=None,
+                 headerstring=None, headers=None):
+    """
+    generator yielding the lists of tokens of `_datatokens`
+    """
+    for line in fp:
+        lst = _linetokens(line, delimitter=delimitter, datastring=datastring,
+                          ignorestring=ignorestring, headerstring=headerstring,
+                          headers=headers)
+        if len(lst) > 0:
+            yield lst
+
+
+def _timedtokens(fp, delimitter='', datastring=None, ignorestring=None,
+                 headerstring=None, headers=None):
+    """
+    generator yielding the lists of tokens of `_datatokens` , adding the time
+    spent reading, filtering and tokenizing lines, and the numbers of bytes,
+    lines and lines of data read to the statistics being collected
+    """
+    times = dict(read=0., filter=0., tokenize=0.)
+    counts = dict(bytes=0, lines=0, keptlines=0)
+    lines = iter(fp)
+    try:
+        while True:
+            start = time.time()
+            line = next(lines, None)
+            read = time.time()
+            times['read'] += read - start
+            if line is None:
+                break
+            counts['bytes'] += len(line)
+            counts['lines'] += 1
+            text = _dataline(line, datastring=datastring,
+                             ignorestring=ignorestring,
+                             headerstring=headerstring, headers=headers)
+            filtered = time.time()
+            times['filter'] += filtered - read
+            if text is None:
+                continue
+            lst = _tokens(text, delimitter=delimitter, datastring=datastring,
+                          ignorestring=ignorestring)
+            times['tokenize'] += time.time() - filtered
+            if len(lst) > 0:
+                counts['keptlines'] += 1
+                yield lst
+    finally:
+        instrument.add(times=times, counts=counts)
+
 
 def file2strarray(file, buffer=False, delimitter='', datastring=None,
-                  ignorestring=None):
+                  ignorestring=None, usecols=None, rowfilter=None):
     """
     load table-like data having consistent columns in a file or string into a
     numpy array of strings
@@ -20,10 +272,13 @@ def file2strarray(file, buffer=False, delimitter='', datastring=None,
 
     Parameters
     ----------
-    file: string, mandatory
+    file: string or buffer, mandatory
         absolute path to file containing the data, or a string containing the
         data (with rows separated by new line characters). If file is not the
-        path to a file, then buffer must be true
+        path to a file, then buffer must be true. The data may also be in any
+        object supporting the buffer protocol, such as a `bytearray` ,
+        `mmap.mmap` or `memoryview` , which is read in place without being
+        copied, and must not be changed while it is read.
     buffer: optional, bool, defaults to False
         If file is a string rather than the path to a file, this must be true
     delimitter: string, optional, defaults to ''
@@ -34,6 +289,14 @@ def file2strarray(file, buffer=False, delimitter='', datastring=None,
         off.
     ignorestring: string, optional, defaults to `None` 
         string after which any line is ignored
+    usecols: list of ints, optional, defaults to `None`
+        if not `None` , indices of the only columns to keep, in the order in
+        which they are kept
+    rowfilter: list of tuples or callable, optional, defaults to `None`
+        if not `None` , only rows passing the filter are kept, as in
+        `file2recarray` , where the fields are named 'f0', 'f1', ... in the
+        order of the columns kept, and have types guessed from each chunk for
+        callables
 
 
     Returns
@@ -58,55 +321,63 @@ def file2strarray(file, buffer=False, delimitter='', datastring=None,
     >>> dd = file2strarray(contents, buffer=True)
     >>> (d == dd).all()
     True
+    >>> import bz2
+    >>> dd = file2strarray(bz2.compress(contents), buffer=True)
+    >>> (d == dd).all()
+    True
+    >>> dd = file2strarray(bytearray(contents), buffer=True)
+    >>> (d == dd).all()
+    True
     >>> fname = os.path.join(_here,'example_data/table_data_ps.dat')
     >>> x = file2strarray(fname, datastring='SN:')
     >>> np.shape(x)
     (2, 27)
+    >>> file2strarray(fname, datastring='SN:', usecols=[2, 0])
+    array([['0', '17186'],
+           ['0.001000', '06D3em']], dtype='|S8')
+    >>> file2strarray(fname, datastring='SN:', usecols=[2, 0],
+    ...               rowfilter=[('f1', 'in', ['06D3em'])])
+    array([['0.001000', '06D3em']], dtype='|S8')
 
 
     .. note:: 1. Cofirmation of buffer was introduced in order to prevent \
             errors where an incorrect filename passed was interpreted as a \
             buffer.
+            2. Files or buffers compressed with gzip, bzip2 or xz (which \
+            requires the lzma module) are decompressed as they are read.
 
     """
-    # Check if this is a path to a file or a string
-    if os.path.isfile(file):
-        fp = open(file)
+    if usecols is not None and not all(isinstance(col, (int, long))
+                                       for col in usecols):
+        raise ValueError('usecols must be indices of columns')
+    fp = _openfile(file, buffer=buffer)
+    data = _datatokens(fp, delimitter=delimitter, datastring=datastring,
+                       ignorestring=ignorestring)
+    if rowfilter is not None:
+        blocks = list(_filterblocks(_columnblocks(data, usecols=usecols),
+                                    rowfilter))
+        fp.close()
+        if len(blocks) == 0:
+            return np.array([])
+        with instrument.phase('assemble'):
+            data = np.column_stack([np.concatenate(cols)
+                                    for cols in zip(*blocks)])
+        instrument.add(counts=dict(rows=len(data)))
+        return data
+    if usecols is None:
+        data = list(data)
     else:
-        # this is a string, Check if buffer is true
-        if not buffer:
-            raise ValueError('The file does not exist, and buffer is False,\
-                             so cannot iterpret as data stream')
-        fp = cStringIO.StringIO(file)
-
-    # line = fp.readline()
-    # line = line.strip()
-    data = []
-
-    # while line != '':
-    for i, line in enumerate(fp):
-        lst = []
-        line = line.strip()
-        # probably can get rid of the not line case as it will be trapped by else
-        if not line:
-            continue
-        if datastring is None:
-            lst = utils.tokenizeline(line, delimitter=delimitter)[0]
-            # data.append(lst)
-        elif line.startswith(datastring):
-            # print 'line ', line
-            lst = utils.tokenizeline(line, delimitter=delimitter,
-                                     prependstring=datastring,
-                                     ignorestrings=ignorestring)[0]
-        if len(lst) > 0:
-            data.append(lst)
+        data = map(_projector(usecols), data)
     fp.close()
-    data = np.asarray(data)
+    with instrument.phase('assemble'):
+        data = np.asarray(data)
+    instrument.add(counts=dict(rows=len(data)))
     return data
 
 
 def arraydtypes(stringarray, names=None, titles=None, types=None,
-                returndtype=True):
+                returndtype=True, sample=None, exactstrings=False,
+                compact=False):
     """
     returns a list of types of columns in a 2D array of strings
 
@@ -115,6 +386,18 @@ def arraydtypes(stringarray, names=None, titles=None, types=None,
     ----------
     stringarray: 2D array of strings, mandatory
         input array
+    sample: int, optional, defaults to `None`
+        if not `None` , the types are guessed from at most sample rows, half
+        of them the first rows and the rest evenly spaced through the array,
+        rather than from all the rows
+    exactstrings: bool, optional, defaults to False
+        if True, the types of columns of strings are as wide as their longest
+        string (from all the rows), rather than 'a20'
+    compact: bool, optional, defaults to False
+        if True, the types of columns of integers are the smallest of 'i1',
+        'i2', 'i4' and 'i8' holding their values, and the types of columns
+        of floats are 'f8' rather than 'f4' if 'f4' does not keep all the
+        significant digits of their values (from all the rows)
 
 
     Returns
@@ -135,6 +418,13 @@ def arraydtypes(stringarray, names=None, titles=None, types=None,
     'f4'
     >>> types[-4]
     'i8'
+    >>> arraydtypes(d, returndtype=False, sample=10) == types
+    True
+    >>> arraydtypes(d, returndtype=False, exactstrings=True)[0]
+    'a6'
+    >>> arraydtypes(np.array([['53678.491234', '12'], ['53679.1', '-3']]),
+    ...             returndtype=False, compact=True)
+    ['f8', 'i1']
     >>> arraydtypes(d)
     dtype([('f0', 'S20'), ('f1', '<f4'), ('f2', '<f4'), ('f3', '<f4'), ('f4', '<f4'), ('f5', '<f4'), ('f6', '<f4'), ('f7', '<f4'), ('f8', '<f4'), ('f9', '<f4'), ('f10', '<f4'), ('f11', '<f4'), ('f12', '<f4'), ('f13', '<f4'), ('f14', '<f4'), ('f15', '<f4'), ('f16', '<f4'), ('f17', '<i8'), ('f18', '<f4'), ('f19', '<f4'), ('f20', '<f4'), ('f21', '<f4'), ('f22', '<i8'), ('f23', '<i8'), ('f24', '<f4'), ('f25', '<f4'), ('f26', '<f4')])
 
@@ -146,10 +436,16 @@ def arraydtypes(stringarray, names=None, titles=None, types=None,
     # If types is None, find types
     if types is None:
         numrows, numcols = np.shape(stringarray)
+        sampled = stringarray
+        if sample is not None:
+            sampled = stringarray[_sampleindices(numrows, sample)]
         types = []
-        for i in range(numcols):
-            t = utils.guessarraytype(stringarray[:, i])
-            types.append(t)
+        with instrument.phase('infer'):
+            for i in range(numcols):
+                t = utils.guessarraytype(sampled[:, i])
+                t = _refinetype(t, [stringarray[:, i]],
+                                exactstrings=exactstrings, compact=compact)
+                types.append(t)
 
     if returndtype:
         dt = np.format_parser(formats=types, names=names, titles=titles).dtype
@@ -158,7 +454,9 @@ def arraydtypes(stringarray, names=None, titles=None, types=None,
         return types
 
 
-def strarray2recarray(stringarray, names=None, types=None, titles=None):
+def strarray2recarray(stringarray, names=None, types=None, titles=None,
+                      sample=None, exactstrings=False, compact=False,
+                      categorical=None, output='recarray'):
     """
     stringarray2typedarray converts a 2D array of strings into a structured
     array. The datatypes may be guessed or supplied, and similarly names will
@@ -176,11 +474,32 @@ def strarray2recarray(stringarray, names=None, types=None, titles=None):
         types of variables corresponding to fields or columns of stringarray
     titles: list of strings, optional, defaults to `None`
         alias for names of fields, as required by `np.format_parser`
+    sample: int, optional, defaults to `None`
+        if not `None` and types is `None` , the types are guessed from a
+        sample of rows as in `arraydtypes` . Columns having values outside
+        the sample that do not fit the guessed types are promoted to the
+        types guessed from all their values.
+    exactstrings: bool, optional, defaults to False
+        if True and types is `None` , the types of columns of strings are as
+        wide as their longest string, rather than 'a20'
+    compact: bool, optional, defaults to False
+        if True and types is `None` , the types of numerical columns are the
+        smallest types keeping their values, as in `arraydtypes`
+    categorical: list of ints or strings, or True, optional, defaults to `None`
+        if not `None` , columns stored as integer codes of their values, as
+        in `file2recarray`
+    output: string, optional, defaults to 'recarray'
+        if 'columns' , the table is returned as an ordered dictionary of
+        contiguous 1D arrays by field name, each one filled directly from
+        the data rather than from a structured array
 
 
     Returns
     -------
-    `np.recarray` or structured array
+    `np.recarray` or structured array, or `collections.OrderedDict` of
+    arrays if output is 'columns' , or if categorical is not `None` , the
+    tuple of the table and the dictionary of the arrays of values of the
+    encoded fields by name
 
 
     Examples
@@ -189,6 +508,26 @@ def strarray2recarray(stringarray, names=None, types=None, titles=None):
     >>> d = file2strarray(fname)
     >>> arrdtypes = arraydtypes(d)
     >>> x = strarray2recarray(d)
+    >>> strarray2recarray(d, sample=10).dtype == arrdtypes
+    True
+    >>> strarray2recarray(np.array([['1'], ['2'], ['3'], ['x']]), sample=2)['f0']
+    array(['1', '2', '3', 'x'], dtype='|S20')
+    >>> strarray2recarray(d, exactstrings=True).dtype['f0']
+    dtype('S6')
+    >>> strarray2recarray(d, compact=True).dtype['f22']
+    dtype('int8')
+    >>> y, categories = strarray2recarray(d[:, [0, 22]], categorical=['f1'])
+    >>> y.dtype
+    dtype([('f0', 'S20'), ('f1', 'i1')])
+    >>> categories['f1']
+    array(['1', '4'], dtype='|S1')
+    >>> columns = strarray2recarray(d, output='columns')
+    >>> columns.keys() == list(x.dtype.names)
+    True
+    >>> columns['f1'].flags['C_CONTIGUOUS']
+    True
+    >>> (columns['f1'] == x['f1']).all()
+    True
     >>> x.dtype == arrdtypes
     True
     >>> len(d) == len(x['f0'])
@@ -202,21 +541,701 @@ def strarray2recarray(stringarray, names=None, types=None, titles=None):
     simultaneously through `res.dtype.names = newnames`
     """
     numrows, numcols = np.shape(stringarray)
+    block = [stringarray[:, i] for i in range(numcols)]
+    instrument.add(counts=dict(rows=numrows))
+    if categorical is None:
+        return _blocks2recarray([block], names=names, types=types,
+                                titles=titles, sample=sample,
+                                exactstrings=exactstrings, compact=compact,
+                                output=output)
+    categories = {}
+    a = _blocks2recarray([block], names=names, types=types, titles=titles,
+                         sample=sample, exactstrings=exactstrings,
+                         compact=compact, categorical=categorical,
+                         categories=categories, output=output)
+    return a, categories
+
+
+def _sampleindices(numrows, sample):
+    """
+    returns the sorted indices of at most sample rows out of numrows, half
+    of them the first rows and the rest evenly spaced through the remaining
+    rows
+    """
+    if numrows <= sample:
+        return np.arange(numrows)
+    numhead = sample // 2
+    rest = np.linspace(numhead, numrows - 1, sample - numhead).astype(int)
+    return np.union1d(np.arange(numhead), rest)
 
-    arrdtypes = arraydtypes(stringarray, names=names, titles=titles,
-                            types=types, returndtype=True)
 
-    cols = []
-    for i in range(numcols):
-        t = np.array(stringarray[:, i], dtype=arrdtypes[i])
-        cols.append(t)
+def _guesstypes(blocks, sample=None):
+    """
+    returns the list of types of the columns in a list of blocks of columns
+    of strings, guessed from all the rows or from sample rows chosen by
+    `_sampleindices`
+    """
+    numcols = len(blocks[0])
+    if sample is None:
+        return [utils.promotetypes(utils.guessarraytype(block[i])
+                                   for block in blocks)
+                for i in range(numcols)]
+
+    # Find the sampled rows within each block
+    numrows = sum(len(block[0]) for block in blocks)
+    indices = _sampleindices(numrows, sample)
+    sampled = []
+    start = 0
+    for block in blocks:
+        stop = start + len(block[0])
+        rows = indices[(indices >= start) & (indices < stop)] - start
+        if len(rows) > 0:
+            sampled.append([col[rows] for col in block])
+        start = stop
+    return [utils.promotetypes(utils.guessarraytype(block[i])
+                               for block in sampled)
+            for i in range(numcols)]
+
+
+def _exactstringtype(t, cols):
+    """
+    returns the string type whose width is the length of the longest string
+    in the list of arrays of strings cols if t is a string type, and t
+    otherwise
+    """
+    if np.dtype(t).kind != 'S':
+        return t
+    lengths = [np.char.str_len(col).max() for col in cols if len(col) > 0]
+    return 'a{}'.format(max([1] + lengths))
+
 
-    # Create tuple
-    recs = zip(*cols)
-    a = np.array(recs, dtype=arrdtypes)
+def _significantdigits(arr):
+    """
+    returns the numbers of significant digits written in an array of strings
+    of floats
+    """
+    mantissas = np.char.partition(np.char.lower(arr), 'e')[..., 0]
+    digits = np.char.replace(np.char.lstrip(mantissas, '+-'), '.', '')
+    return np.char.str_len(np.char.lstrip(digits, '0'))
+
+
+def _compacttype(t, cols):
+    """
+    returns the smallest integer type holding the values of the list of
+    arrays of strings cols if t is an integer type, 'f4' or 'f8' if t is a
+    float type, depending on whether 'f4' keeps the significant digits of
+    all the values, and t otherwise, or if the values do not fit t
+    """
+    kind = np.dtype(t).kind
+    cols = [col for col in cols if len(col) > 0]
+    if kind not in 'if' or len(cols) == 0:
+        return t
+    if kind == 'i':
+        try:
+            values = [utils.castarray(col, 'i8') for col in cols]
+        except ValueError:
+            return t
+        low = min(v.min() for v in values)
+        high = max(v.max() for v in values)
+        for itype in ('i1', 'i2', 'i4'):
+            info = np.iinfo(itype)
+            if info.min <= low and high <= info.max:
+                return itype
+        return 'i8'
+    for col in cols:
+        try:
+            values = col.astype(np.float64)
+        except ValueError:
+            return t
+        with np.errstate(all='ignore'):
+            single = values.astype(np.float32).astype(np.float64)
+            error = np.abs(single - values)
+
+            # half a unit in the last significant digit written
+            scale = np.floor(np.log10(np.abs(values)))
+            ulp = 0.5 * 10 ** (scale - _significantdigits(col) + 1)
+            fits = ((error <= ulp) | (single == values) |
+                    ~np.isfinite(values))
+        if not fits.all():
+            return 'f8'
+    return 'f4'
+
+
+def _refinetype(t, cols, exactstrings=False, compact=False):
+    """
+    returns the type t guessed for a column given as the list of arrays of
+    strings cols, with the exact width of the strings if exactstrings is
+    True, and narrowed by `_compacttype` if compact is True
+    """
+    if exactstrings:
+        t = _exactstringtype(t, cols)
+    if compact:
+        t = _compacttype(t, cols)
+    return t
+
+
+def _codetype(numvalues):
+    """
+    returns the smallest integer type holding codes for numvalues values
+    """
+    for t in ('i1', 'i2', 'i4'):
+        if numvalues <= np.iinfo(t).max + 1:
+            return t
+    return 'i8'
+
+
+def _encodecolumn(blocks, i, itemsize=None):
+    """
+    replaces the column i of a list of blocks of columns by integer codes of
+    its values, and returns the sorted array of its distinct values, which
+    the codes index. If itemsize is not None, the column is only encoded,
+    if the codes and values are smaller than the column stored with
+    itemsize bytes per value, and `None` is returned otherwise.
+    """
+    col = np.concatenate([block[i] for block in blocks])
+    values, codes = np.unique(col, return_inverse=True)
+    codes = codes.astype(_codetype(len(values)))
+    if itemsize is not None and (codes.nbytes + values.nbytes >=
+                                 len(col) * itemsize):
+        return None
+    del col
+    if values.dtype.kind == 'S':
+        values = values.astype(_exactstringtype('a20', [values]))
+    start = 0
+    for block in blocks:
+        stop = start + len(block[i])
+        block[i] = codes[start:stop]
+        start = stop
+    return values
+
+
+def _categoricalcolumns(categorical, fieldnames, types):
+    """
+    returns the indices of the columns given by categorical, either as
+    indices or as names in fieldnames, or of all the columns of strings
+    according to types if categorical is True
+    """
+    if categorical is True:
+        return [i for i, t in enumerate(types) if np.dtype(t).kind == 'S']
+    indices = []
+    for col in categorical:
+        if isinstance(col, basestring):
+            if col not in fieldnames:
+                raise ValueError('There is no field {} to encode'.format(col))
+            col = fieldnames.index(col)
+        indices.append(col)
+    return indices
+
+
+def _fillfield(field, i, blocks, checked=False):
+    """
+    fills the 1D array field, which may be a field of a structured array,
+    with the column i of a list of blocks of columns, which are not checked
+    by `basicio.utils.castarray` if checked is True
+    """
+    start = 0
+    for block in blocks:
+        col = block[i]
+        field[start:start + len(col)] = utils.castarray(col, field.dtype,
+                                                        checked=checked)
+        start += len(col)
+
+
+def _columnblocks(tokens, chunksize=_chunksize, dtype=None, usecols=None,
+                  numcols=None):
+    """
+    generator grouping the rows of tokens yielded by the iterable tokens into
+    blocks of at most chunksize rows, and yielding each block as a list of 1D
+    `np.ndarray` , one per column, or one per column whose index is in
+    usecols if usecols is not None. If dtype is not None, the columns are
+    converted to the types of the fields of dtype as soon as they are
+    read, otherwise they are arrays of strings. If numcols is not None,
+    every row must have numcols tokens.
+    """
+    rows = []
+    start = 0
+    for lst in tokens:
+        rows.append(lst)
+        if len(rows) == chunksize:
+            with instrument.phase('assemble'):
+                numcols = _checknumcols(rows, numcols, start=start)
+                if start == 0 and dtype is not None:
+                    _checkfields(numcols if usecols is None else len(usecols),
+                                 types=dtype.descr)
+                block = _rows2columns(rows, dtype, usecols=usecols)
+            yield block
+            start += len(rows)
+            rows = []
+    if len(rows) > 0:
+        with instrument.phase('assemble'):
+            numcols = _checknumcols(rows, numcols, start=start)
+            if start == 0 and dtype is not None:
+                _checkfields(numcols if usecols is None else len(usecols),
+                             types=dtype.descr)
+            block = _rows2columns(rows, dtype, usecols=usecols)
+        yield block
+
+
+def _fits(s, t):
+    """
+    returns True if the string s can be converted to the `np.dtype` t
+    without losing its value
+    """
+    try:
+        if t.kind in 'iu':
+            info = np.iinfo(t)
+            return info.min <= int(s) <= info.max
+        if t.kind == 'f':
+            float(s)
+    except ValueError:
+        return False
+    if t.kind == 'S':
+        return len(s) <= t.itemsize
+    return True
+
+
+def _checkedcolumn(col, t, name, start=0):
+    """
+    returns the array of strings col converted to the `np.dtype` t, raising
+    a ValueError giving the first row, counted from start, whose value does
+    not fit t, which is a value that is not a number for numerical types,
+    an integer out of the range of types of integers, or a string longer
+    than types of strings
+    """
+    try:
+        if t.kind in 'iu':
+            values = utils.castarray(col, np.int64)
+            info = np.iinfo(t)
+            if ((values < info.min) | (values > info.max)).any():
+                raise ValueError('Integers out of range')
+            return values.astype(t)
+        if t.kind == 'S' and (np.char.str_len(col) > t.itemsize).any():
+            raise ValueError('Strings too long')
+        return utils.castarray(col, t)
+    except (ValueError, OverflowError):
+        for i, s in enumerate(col):
+            if not _fits(s, t):
+                raise ValueError('Row {} of the data does not fit the schema:'
+                                 ' {!r} is not a value of type {} for the '
+                                 'field {}'.format(start + i, s, t.str,
+                                                   name))
+        raise
+
+
+def _schemablocks(tokens, dtype, numcols, chunksize=_chunksize,
+                  usecols=None):
+    """
+    generator yielding the blocks of columns of the rows of tokens yielded by
+    the iterable tokens, as `_columnblocks` with dtype and usecols, checking
+    that every row has numcols tokens and that its values fit the types of
+    the fields of dtype, as given by `_checkedcolumn` . A ValueError giving
+    the first row which does not is raised as soon as its block is read.
+    """
+    start = 0
+    for block in _columnblocks(tokens, chunksize=chunksize, usecols=usecols,
+                               numcols=numcols):
+        yield [_checkedcolumn(col, dtype[i], dtype.names[i], start=start)
+               for i, col in enumerate(block)]
+        start += len(block[0])
+
+
+def _checknumcols(rows, numcols=None, start=0):
+    """
+    returns the number of columns in the list of token lists rows, or
+    raises a ValueError if rows have different numbers of columns, or a number
+    different from numcols if numcols is not None, giving the first row,
+    counted from start, with a different number
+    """
+    lengths = map(len, rows)
+    if numcols is None and len(lengths) > 0:
+        numcols = lengths[0]
+    if lengths.count(numcols) != len(lengths):
+        i = next(i for i, n in enumerate(lengths) if n != numcols)
+        raise ValueError('The data has an inconsistent number of columns: '
+                         'row {} has {} values rather than {}'
+                         ''.format(start + i, lengths[i], numcols))
+    return numcols
+
+
+def _checkfields(numcols, types=None, names=None):
+    """
+    raises a ValueError if types or names, when they are not `None` , do not
+    have one entry for each of the numcols columns of the data
+    """
+    for kind, values in (('types', types), ('names', names)):
+        if values is not None and len(values) != numcols:
+            raise ValueError('The data has {} columns, but {} {} were given'
+                             ''.format(numcols, len(values), kind))
+
+
+def _projector(usecols):
+    """
+    returns a function selecting the tokens whose indices are in usecols from
+    a list of tokens, as a tuple
+    """
+    getter = operator.itemgetter(*usecols)
+    if len(usecols) == 1:
+        return lambda lst: (getter(lst),)
+    return getter
+
+
+def _rows2columns(rows, dtype=None, usecols=None):
+    """
+    returns a list of 1D `np.ndarray` , one for each column of the list of
+    token lists rows, or for each column whose index is in usecols if usecols
+    is not None, of type given by the fields of dtype, or strings if dtype is
+    None
+    """
+    if usecols is not None:
+        rows = map(_projector(usecols), rows)
+    if dtype is None:
+        return [np.array(col) for col in zip(*rows)]
+    return [np.array(col, dtype=dtype[i]) for i, col in enumerate(zip(*rows))]
+
+
+def _resolveusecols(usecols, headernames=None):
+    """
+    returns the list of indices of the columns in usecols, given either as
+    indices or as names of variables in the list headernames
+    """
+    if usecols is None:
+        return None
+    indices = []
+    for col in usecols:
+        if isinstance(col, basestring):
+            if headernames is None or col not in headernames:
+                raise ValueError('The column {} is not in the headers'
+                                 ''.format(col))
+            col = headernames.index(col)
+        indices.append(col)
+    return indices
+
+
+def _selectnames(headers, names=None, usecols=None, useheaders=True):
+    """
+    returns the tuple (names, usecols) of the names of the fields and the
+    indices of the columns read, given the list of lists of names on the
+    header lines read so far, and the names and usecols requested. The names
+    in the headers are used if useheaders is True.
+    """
+    headernames = None
+    if useheaders:
+        headernames = _namesfromheaders(headers)
+    usecols = _resolveusecols(usecols, headernames)
+    if names is None and headernames is not None:
+        names = headernames
+        if usecols is not None:
+            names = [headernames[i] for i in usecols]
+    return names, usecols
+
+
+# comparisons allowed in row filters
+_comparisons = {'<': operator.lt, '<=': operator.le, '>': operator.gt,
+                '>=': operator.ge, '==': operator.eq, '!=': operator.ne,
+                'in': lambda col, values: np.in1d(col, list(values))}
+
+
+def _rowmask(chunk, rowfilter):
+    """
+    returns the boolean mask of the rows of the structured array chunk, or
+    dictionary of columns, that pass rowfilter, which is either a callable
+    returning such a mask from the chunk, or a list of tuples (name,
+    comparison, value) which must all be true, where comparison is one of the
+    keys of `_comparisons`
+    """
+    if callable(rowfilter):
+        return np.asarray(rowfilter(chunk), dtype=bool)
+    if isinstance(chunk, dict):
+        numrows = len(next(chunk.itervalues()))
+    else:
+        numrows = len(chunk)
+    mask = np.ones(numrows, dtype=bool)
+    for name, comparison, value in rowfilter:
+        if comparison not in _comparisons:
+            raise ValueError('Unknown comparison {} in the row filter'
+                             ''.format(comparison))
+        # NaN stands for strings which are not numbers in comparisons
+        with np.errstate(invalid='ignore'):
+            mask &= _comparisons[comparison](chunk[name], value)
+    return mask
+
+
+def _filtervalues(rowfilter):
+    """
+    returns the dictionary of the lists of values compared with each field
+    named by the list of tuples rowfilter, as given to `_rowmask`
+    """
+    values = {}
+    for name, comparison, value in rowfilter:
+        if comparison == 'in':
+            values.setdefault(name, []).extend(value)
+        else:
+            values.setdefault(name, []).append(value)
+    return values
+
+
+def _tofloat(s):
+    try:
+        return float(s)
+    except ValueError:
+        return np.nan
+
+
+def _comparedcolumn(col, values):
+    """
+    returns the column of strings col converted for comparisons with the
+    list of values of a row filter, whatever the type guessed from col: the
+    strings themselves if any of the values is a string, and otherwise their
+    numbers, integers if the values and the strings are integers, and floats
+    otherwise, with NaN for strings which are not numbers
+    """
+    if any(isinstance(value, basestring) for value in values):
+        return col
+    if (all(isinstance(value, (int, long, np.integer)) for value in values)
+            and utils._isintarray(col)):
+        return utils.castarray(col, np.int64, checked=True)
+    try:
+        return col.astype(np.float64)
+    except ValueError:
+        return np.fromiter(itertools.imap(_tofloat, col), dtype=np.float64,
+                           count=len(col))
+
+
+def _filtercolumns(block, rowfilter, names=None, types=None):
+    """
+    returns the dictionary of the columns of the block of columns block named
+    by the list of tuples rowfilter, as given to `_rowmask` , by name,
+    converted as by `_blocks2recarray` with names and types if types is not
+    `None` , and by `_comparedcolumn` otherwise, so that the comparisons are
+    the same in blocks whose columns would be guessed to have other types
+    """
+    if names is None:
+        names = ['f{}'.format(i) for i in range(len(block))]
+    chunk = {}
+    for name, values in _filtervalues(rowfilter).iteritems():
+        if name not in names:
+            raise ValueError('no field of name {}'.format(name))
+        i = names.index(name)
+        if types is None:
+            with instrument.phase('convert'):
+                chunk[name] = _comparedcolumn(block[i], values)
+            continue
+        chunk[name] = _blocks2recarray([[block[i]]], names=[name],
+                                       types=[types[i]],
+                                       output='columns')[name]
+    return chunk
+
+
+def _filterblocks(blocks, rowfilter, names=None, types=None):
+    """
+    generator yielding the blocks of columns of the iterable blocks with only
+    the rows that pass rowfilter, as given to `_rowmask` . The filter is
+    evaluated on each block converted to types, or to the types guessed from
+    the block if types is None. If rowfilter is a list of tuples, only the
+    columns it names are converted, and the rows kept are converted when the
+    table is assembled. Blocks without any such rows are dropped.
+    """
+    for block in blocks:
+        if callable(rowfilter):
+            chunk = _blocks2recarray([list(block)], names=names, types=types)
+        elif len(rowfilter) == 0:
+            yield block
+            continue
+        else:
+            chunk = _filtercolumns(block, rowfilter, names=names, types=types)
+        mask = _rowmask(chunk, rowfilter)
+        del chunk
+        if mask.any():
+            yield [col[mask] for col in block]
+
+
+def _promotedtype(t, blocks, i, exactstrings=False, compact=False):
+    """
+    returns the type of the column i of a list of blocks of columns of
+    strings, which has values that do not fit the type t guessed from a
+    sample of them, refined as in `_blocks2recarray`
+    """
+    t = utils.promotetypes([t] + [utils.guessarraytype(block[i])
+                                  for block in blocks])
+    return _refinetype(t, [block[i] for block in blocks],
+                       exactstrings=exactstrings, compact=compact)
+
+
+def _blocks2recarray(blocks, names=None, types=None, titles=None,
+                     sample=None, exactstrings=False, compact=False,
+                     categorical=None, categories=None, output='recarray'):
+    """
+    assembles a structured array from a list of blocks of columns, as yielded
+    by `_columnblocks`, or if output is 'columns', an ordered dictionary of
+    arrays by field name. If types is None, the types of the columns are
+    guessed from all the blocks, or sample rows of them, which must then be
+    arrays of strings, and refined by `_refinetype` with exactstrings and
+    compact. Columns that do not fit the types guessed from a sample are
+    promoted. The columns given by categorical, as in `file2recarray` , are
+    stored as integer codes, and the arrays of values indexed by the codes
+    are put in the dictionary categories by field name. The columns of the
+    blocks are released as they are copied.
+    """
+    if output not in _outputs:
+        raise ValueError('output must be one of {}'.format(_outputs))
+    if len(blocks) == 0:
+        if types is None:
+            raise ValueError('No lines of data were found')
+        arrdtypes = np.format_parser(formats=types, names=names,
+                                     titles=titles).dtype
+        if output == 'columns':
+            return collections.OrderedDict((name, np.empty(0, arrdtypes[i]))
+                                           for i, name in
+                                           enumerate(arrdtypes.names))
+        return np.empty(0, dtype=arrdtypes)
+    numcols = len(blocks[0])
+    _checkfields(numcols, types=types, names=names)
+    promote = types is None and sample is not None
+    # types guessed from all the rows are known to fit them
+    checked = types is None and sample is None
+    if types is None:
+        with instrument.phase('infer'):
+            types = _guesstypes(blocks, sample=sample)
+            types = [_refinetype(t, [block[i] for block in blocks],
+                                 exactstrings=exactstrings, compact=compact)
+                     for i, t in enumerate(types)]
+    arrdtypes = np.format_parser(formats=types, names=names,
+                                 titles=titles).dtype
+
+    if categorical is not None:
+        types = [arrdtypes[i].str for i in range(numcols)]
+        fieldnames = list(arrdtypes.names)
+        for i in _categoricalcolumns(categorical, fieldnames, types):
+            itemsize = None
+            if categorical is True:
+                itemsize = arrdtypes[i].itemsize
+            with instrument.phase('convert'):
+                values = _encodecolumn(blocks, i, itemsize=itemsize)
+            if values is not None:
+                categories[fieldnames[i]] = values
+                types[i] = blocks[0][i].dtype.str
+        arrdtypes = np.format_parser(formats=types, names=names,
+                                     titles=titles).dtype
+
+    numrows = sum(len(block[0]) for block in blocks)
+    if output == 'columns':
+        # each column is allocated and filled on its own
+        columns = collections.OrderedDict()
+        for i, name in enumerate(arrdtypes.names):
+            col = np.empty(numrows, dtype=arrdtypes[i])
+            try:
+                with instrument.phase('convert'):
+                    _fillfield(col, i, blocks, checked=checked)
+            except ValueError:
+                if not promote:
+                    raise
+                with instrument.phase('infer'):
+                    t = _promotedtype(types[i], blocks, i,
+                                      exactstrings=exactstrings,
+                                      compact=compact)
+                col = np.empty(numrows, dtype=t)
+                with instrument.phase('convert'):
+                    _fillfield(col, i, blocks)
+            columns[name] = col
+            for block in blocks:
+                block[i] = None
+        return columns
+
+    a = np.empty(numrows, dtype=arrdtypes)
+    for i in range(numcols):
+        try:
+            with instrument.phase('convert'):
+                _fillfield(a[arrdtypes.names[i]], i, blocks, checked=checked)
+        except ValueError:
+            if not promote:
+                raise
+            # A value outside the sample does not fit: change the type of
+            # the field, keeping the fields filled so far
+            with instrument.phase('infer'):
+                types[i] = _promotedtype(types[i], blocks, i,
+                                         exactstrings=exactstrings,
+                                         compact=compact)
+            with instrument.phase('assemble'):
+                arrdtypes = np.format_parser(formats=types, names=names,
+                                             titles=titles).dtype
+                promoted = np.empty(numrows, dtype=arrdtypes)
+                for name in arrdtypes.names[:i]:
+                    promoted[name] = a[name]
+            a = promoted
+            with instrument.phase('convert'):
+                _fillfield(a[arrdtypes.names[i]], i, blocks)
+        for block in blocks:
+            block[i] = None
     return a
 
 
+def _rereadblocks(file, buffer=False, tokenargs=None, chunksize=_batchsize,
+                  usecols=None, rowfilter=None, names=None):
+    """
+    generator yielding the blocks of columns of strings of a file or buffer
+    read again, as by `file2recarray` , with the arguments of `_datatokens`
+    in the dictionary tokenargs
+    """
+    with contextlib.closing(_openfile(file, buffer=buffer)) as fp:
+        blocks = _columnblocks(_datatokens(fp, **tokenargs),
+                               chunksize=chunksize, usecols=usecols)
+        if rowfilter is not None:
+            blocks = _filterblocks(blocks, rowfilter, names=names)
+        for block in blocks:
+            yield block
+
+
+def _exactfloats(cols):
+    """
+    returns True if the integers in the list of arrays cols are all converted
+    to floats as they would be from their strings
+    """
+    return all(-_maxexactint < col.min() and col.max() < _maxexactint
+               for col in cols)
+
+
+def _typedblocks(blocks, reread):
+    """
+    returns the tuple (blocks, types) of the list of the blocks of columns of
+    strings yielded by the iterable blocks, each converted as soon as it is
+    read to the types guessed from the blocks read so far, so that a single
+    block of strings is held at a time, and of the types guessed from all
+    the blocks, as by `_blocks2recarray` . Columns of integers which a later
+    block promotes to floats are converted in place, and the other promoted
+    columns are converted again from the strings of the blocks yielded by
+    reread(numblocks), which reads the first numblocks blocks again.
+    """
+    types = None
+    typed = []
+    for block in blocks:
+        with instrument.phase('infer'):
+            guessed = [utils.guessarraytype(col) for col in block]
+        if types is None:
+            types = guessed
+        promoted = [utils.promotetypes([t, u])
+                    for t, u in zip(types, guessed)]
+        redo = []
+        for i, (t, u) in enumerate(zip(types, promoted)):
+            if t == u:
+                continue
+            cols = [b[i] for b in typed]
+            if np.dtype(u).kind == 'f' and _exactfloats(cols):
+                with instrument.phase('convert'):
+                    for b in typed:
+                        b[i] = b[i].astype(u)
+            else:
+                redo.append(i)
+        if len(redo) > 0:
+            for b, strings in itertools.izip(typed, reread(len(typed))):
+                for i in redo:
+                    b[i] = utils.castarray(strings[i], promoted[i],
+                                           checked=True)
+        types = promoted
+        typed.append([utils.castarray(col, t, checked=True)
+                      for col, t in zip(block, types)])
+    return typed, types
+
+
 def _validatevarlist(names, lst):
     """
     Ensure that two lists are equal or raise errors, wrapper for more stuff
@@ -227,6 +1246,37 @@ def _validatevarlist(names, lst):
                 are inconsistent')
 
 
+def _headertokens(line, headerstring, ignorestring=None, delimiter=None):
+    """
+    returns the list of variable names on a stripped header line starting
+    with headerstring
+    """
+    line = line.lstrip(headerstring)
+    if ignorestring is not None:
+        line = line.split(ignorestring)[0]
+    line = line.strip()
+
+    # split the line in variable names
+    if delimiter is not None:
+        return line.split(delimiter)
+    return line.split()
+
+
+def _namesfromheaders(headers, singleheader=True):
+    """
+    returns the list of variable names from a list of the lists of names
+    found on header lines, in the way of `getheaders` , or `None` if there
+    are no headers
+    """
+    if len(headers) == 0:
+        return None
+    if not singleheader:
+        return [name for varlist in headers for name in varlist]
+    for varlist in headers[1:]:
+        _validatevarlist(headers[0], varlist)
+    return headers[0]
+
+
 def getheaders(fname, headerstring, ignorestring=None, singleheader=True,
                exitonfind=False, delimiter=None):
     """
@@ -275,23 +1325,16 @@ def getheaders(fname, headerstring, ignorestring=None, singleheader=True,
     is False, and multiple headers with inconsistent variable names are found.
     """
     names = []
-    with open(fname) as fp:
+    with contextlib.closing(_openfile(fname)) as fp:
         for line in fp:
 
             # In case there is a leading whitespace
             line = line.strip()
 
             if line.startswith(headerstring):
-                line = line.lstrip(headerstring)
-                if ignorestring is not None:
-                    line = line.split(ignorestring)[0]
-                line = line.strip()
-
-                # split the line in variable names
-                if delimiter is not None:
-                    varlist = line.split(delimiter)
-                else:
-                    varlist = line.split()
+                varlist = _headertokens(line, headerstring,
+                                        ignorestring=ignorestring,
+                                        delimiter=delimiter)
 
                 # Should we add this to names?
                 if len(names) == 0 or not singleheader:
@@ -311,9 +1354,506 @@ def getheaders(fname, headerstring, ignorestring=None, singleheader=True,
     return names
 
 
+def _byteranges(fname, numranges):
+    """
+    returns a list of at most numranges tuples (start, stop) of byte offsets
+    splitting the file fname into ranges of whole lines of similar sizes
+    """
+    size = os.path.getsize(fname)
+    bounds = [0]
+    with open(fname, 'rb') as fp:
+        for i in range(1, numranges):
+            # move on to the start of the next line
+            fp.seek(size * i // numranges)
+            fp.readline()
+            pos = fp.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return zip(bounds[:-1], bounds[1:])
+
+
+@contextlib.contextmanager
+def _maprange(fname, start, stop):
+    """
+    context manager giving the bytes from start to stop of the file fname as
+    a buffer of a read only memory map of the file, so that the processes
+    parsing ranges of a file share its pages rather than each reading a
+    copy of its range. The buffer must not be used after the block.
+    """
+    if stop <= start:
+        yield ''
+        return
+    with open(fname, 'rb') as fp:
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield buffer(mapped, start, stop - start)
+    finally:
+        mapped.close()
+
+
+def _parserange(args):
+    """
+    parses the lines of data in a range of bytes of a file into a list of
+    columns, for the process pool of `_parallelblocks` . args is the tuple
+    (fname, start, stop, types, options) where options is a dictionary of
+    the arguments sample, usecols, rowfilter, names, exactstrings and compact
+    of `_parallelblocks` and of the arguments passed to `_datatokens` under
+    'tokenargs'. The returned tuple is (types, columns, headers) where types
+    are those guessed for the range, from sample rows if sample is not None,
+    if types is None, refined for the range by `_refinetype` (and only
+    widened if types are given), and headers are the lists of names on the
+    header lines of the range.
+    Ranges without data return (None, None, headers).
+    """
+    fname, start, stop, types, options = args
+    headers = []
+    with _maprange(fname, start, stop) as data:
+        blocks = _columnblocks(_datatokens(cStringIO.StringIO(data),
+                                           headers=headers,
+                                           **options['tokenargs']),
+                               usecols=options['usecols'])
+        if options['rowfilter'] is not None:
+            blocks = _filterblocks(blocks, options['rowfilter'],
+                                   names=options['names'], types=types)
+        blocks = list(blocks)
+    if len(blocks) == 0:
+        return None, None, headers
+    numcols = len(blocks[0])
+    promote = types is None
+    if types is None:
+        types = _guesstypes(blocks, sample=options['sample'])
+    columns = []
+    for i in range(numcols):
+        col = np.concatenate([block[i] for block in blocks])
+        for block in blocks:
+            block[i] = None
+        refined = _refinetype(types[i], [col],
+                              exactstrings=options['exactstrings'],
+                              compact=options['compact'])
+        if promote:
+            types[i] = refined
+        else:
+            # types given for the whole file are only widened
+            types[i] = utils.promotetypes([types[i], refined])
+        try:
+            typed = utils.castarray(col, types[i])
+        except ValueError:
+            if not promote:
+                raise
+            types[i] = utils.promotetypes([types[i],
+                                           utils.guessarraytype(col)])
+            types[i] = _refinetype(types[i], [col],
+                                   exactstrings=options['exactstrings'],
+                                   compact=options['compact'])
+            typed = utils.castarray(col, types[i])
+        columns.append(typed)
+    return types, columns, headers
+
+
+def _widens(fromtypes, totypes):
+    """
+    returns True if columns of types fromtypes can be converted to totypes
+    without parsing them again, which is if the types are the same or differ
+    only in the width of integers or strings
+    """
+    for t, u in zip(fromtypes, totypes):
+        t, u = np.dtype(t), np.dtype(u)
+        if t != u and not (t.kind == u.kind and t.kind in 'iS'):
+            return False
+    return True
+
+
+def _parallelblocks(fname, workers, types=None, delimiter='',
+                    datastring=None, ignorestring=None, headerstring=None,
+                    sample=None,
+                    usecols=None, rowfilter=None, names=None,
+                    exactstrings=False, compact=False):
+    """
+    parses a file in a pool of processes and returns the tuple (blocks,
+    types, headers) of the list of blocks of columns, one for each range of
+    lines, the types of the columns, and the lists of names on the header
+    lines of the file. If types is None, each process guesses the
+    types of its range, from sample rows of the range if sample is not None,
+    refined with exactstrings and compact, and ranges whose types cannot be
+    widened to the types promoted over all the ranges are parsed again with
+    those types, until the types agree.
+    """
+    import multiprocessing
+
+    options = dict(sample=sample, usecols=usecols, rowfilter=rowfilter,
+                   names=names, exactstrings=exactstrings and types is None,
+                   compact=compact and types is None,
+                   tokenargs=dict(delimitter=delimiter,
+                                  datastring=datastring,
+                                  ignorestring=ignorestring,
+                                  headerstring=headerstring))
+    ranges = _byteranges(fname, workers)
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_parserange, [(fname, start, stop, types, options)
+                                         for start, stop in ranges])
+        headers = [varlist for res in results for varlist in res[2]]
+        found = [(r, res) for r, res in zip(ranges, results)
+                 if res[0] is not None]
+        if len(found) == 0:
+            return [], types, headers
+        if len(set(len(res[1]) for r, res in found)) != 1:
+            raise ValueError('The data has an inconsistent number of columns')
+
+        if types is None:
+            types = [utils.promotetypes(coltypes)
+                     for coltypes in zip(*[res[0] for r, res in found])]
+            redo = [i for i, (r, res) in enumerate(found)
+                    if not _widens(res[0], types)]
+            while len(redo) > 0:
+                redone = pool.map(_parserange,
+                                  [(fname, found[i][0][0], found[i][0][1],
+                                    types, options) for i in redo])
+                for i, res in zip(redo, redone):
+                    found[i] = (found[i][0], res)
+
+                # ranges parsed again may refine their types further
+                types = [utils.promotetypes(coltypes)
+                         for coltypes in zip(*[res[0] for r, res in found])]
+                redo = [i for i, (r, res) in enumerate(found)
+                        if not _widens(res[0], types)]
+    finally:
+        pool.close()
+        pool.join()
+    return [res[1] for r, res in found], types, headers
+
+
+def _bytetable(chars):
+    """
+    returns a boolean lookup table of the 256 byte values, which is True for
+    the bytes in the string chars
+    """
+    table = np.zeros(256, dtype=bool)
+    table[np.frombuffer(chars, dtype=np.uint8)] = True
+    return table
+
+
+# classes of the bytes of purely numeric tables: whitespace separating
+# tokens, as in `str.split` , bytes of integers, and bytes of other numbers,
+# which are decimal points, exponents and the letters of nan and inf. Other
+# bytes are of class 0.
+_spacebyte, _intbyte, _floatbyte = 1, 2, 3
+_byteclasses = (_spacebyte * _bytetable(' \t\n\r\x0b\x0c') +
+                _intbyte * _bytetable('0123456789+-') +
+                _floatbyte * _bytetable('.eEnNaAiIfFtTyY')).astype(np.uint8)
+
+# number appended to blocks of numbers, which is only parsed if all the
+# numbers before it are
+_sentinel = -9.87654321e-300
+
+# integers larger than this are not exactly represented by floats
+_maxexactint = 2 ** 53
+
+
+def _textblocks(fp, blocksize=2 ** 22):
+    """
+    generator yielding the contents of the open file fp as strings of about
+    blocksize bytes made of whole lines
+    """
+    tail = ''
+    while True:
+        with instrument.phase('read'):
+            data = fp.read(blocksize)
+        if not data:
+            break
+        end = data.rfind('\n') + 1
+        if end == 0:
+            tail += data
+            continue
+        yield tail + data[:end]
+        tail = data[end:]
+    if tail:
+        yield tail
+
+
+def _firstdataline(text, headerstring=None, headers=None):
+    """
+    returns the tuple of the list of tokens of the first line of data in the
+    string text, following the rules of `_linetokens` , and of the offset of
+    the line, or (`None` , len(text)) if there is no such line. Names on
+    header lines preceding it are appended to headers.
+    """
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start) + 1 or len(text)
+        lst = _linetokens(text[start:end], headerstring=headerstring,
+                          headers=headers)
+        if len(lst) > 0:
+            return lst, start
+        start = end
+    return None, start
+
+
+def _numericlines(text, headerstring=None, headers=None):
+    """
+    returns the lines of data in the string text, following the rules of
+    `_linetokens` , without comments
+    """
+    lines = []
+    for line in text.split('\n'):
+        line = _dataline(line, headerstring=headerstring, headers=headers)
+        if line is not None:
+            lines.append(line.split('#')[0])
+    return '\n'.join(lines)
+
+
+def _parsenumbers(text, numcols, usecols=None):
+    """
+    returns the tuple of the 2D `np.float64` array of the numbers in the
+    string text, whose lines are either blank or have numcols numbers
+    separated by whitespace, and of the 2D boolean array of the numbers
+    which are not integers, or `None` if there are tokens which are not
+    numbers. A ValueError is raised if the lines have other numbers of
+    tokens. If usecols is not None, only the columns whose indices are in
+    usecols are converted and returned, the others being cut out of the text
+    before the conversion.
+    """
+    with instrument.phase('tokenize'):
+        b = np.frombuffer(text, dtype=np.uint8)
+        classes = _byteclasses[b]
+        if not classes.all():
+            return None
+        space = classes == _spacebyte
+        starts = np.flatnonzero(space[:-1] & ~space[1:]) + 1
+        if len(b) > 0 and not space[0]:
+            starts = np.concatenate(([0], starts))
+        if len(starts) == 0:
+            return np.empty((0, numcols)), np.empty((0, numcols), dtype=bool)
+
+        # numbers of tokens on each line
+        ends = np.searchsorted(starts, np.flatnonzero(b == ord('\n')))
+        numtokens = np.diff(np.concatenate(([0], ends, [len(starts)])))
+        if ((numtokens != 0) & (numtokens != numcols)).any():
+            raise ValueError('The data has an inconsistent number of columns')
+        isfloat = np.logical_or.reduceat(classes == _floatbyte, starts)
+        isfloat = isfloat.reshape(-1, numcols)
+        columns = range(numcols)
+        if usecols is not None:
+            isfloat = isfloat[:, usecols]
+            columns = sorted(set(usecols))
+        if len(columns) < numcols:
+            # every line of data has numcols tokens, so that the columns of
+            # the tokens repeat, and the text is cut into the tokens followed
+            # by their whitespace, keeping those of the columns
+            kept = np.zeros(numcols, dtype=bool)
+            kept[columns] = True
+            kept = np.tile(kept, len(starts) // numcols)
+            lengths = np.diff(np.concatenate((starts, [len(b)])))
+            text = b[starts[0]:][np.repeat(kept, lengths)].tostring()
+    with instrument.phase('convert'):
+        values = np.fromstring(text + '\n' + repr(_sentinel),
+                               dtype=np.float64, sep=' ')
+    numvalues = len(starts) // numcols * len(columns)
+    if len(values) != numvalues + 1 or values[-1] != _sentinel:
+        return None
+    values = values[:-1].reshape(-1, len(columns))
+    if usecols is not None and list(usecols) != columns:
+        values = values[:, [columns.index(i) for i in usecols]]
+    return values, isfloat
+
+
+def _numerictypes(floats):
+    """
+    returns the types guessed for the columns of a list of 2D boolean arrays
+    of the numbers which are not integers in blocks of rows
+    """
+    isfloat = np.zeros(floats[0].shape[1], dtype=bool)
+    for block in floats:
+        isfloat |= block.any(axis=0)
+    return ['f4' if f else 'i8' for f in isfloat]
+
+
+def _numerictable(arrays, dtype, output='recarray'):
+    """
+    returns the structured array of type dtype, or the ordered dictionary of
+    arrays by field name if output is 'columns' , of the list of 2D arrays
+    of the numbers in blocks of rows
+    """
+    numrows = sum(len(values) for values in arrays)
+    with instrument.phase('assemble'):
+        if output == 'columns':
+            table = collections.OrderedDict(
+                (name, np.empty(numrows, dtype=dtype[i]))
+                for i, name in enumerate(dtype.names))
+        else:
+            table = np.empty(numrows, dtype=dtype)
+        start = 0
+        for values in arrays:
+            for i, name in enumerate(dtype.names):
+                table[name][start:start + len(values)] = values[:, i]
+            start += len(values)
+    return table
+
+
+def _numericmask(values, isfloat, rowfilter, types=None, names=None,
+                 titles=None):
+    """
+    returns the boolean mask of the rows of the 2D array of numbers values
+    of a block, whose numbers which are not integers are given by isfloat,
+    passing rowfilter, as given to `_rowmask` . As in `_filterblocks` ,
+    callables are evaluated on the block as a structured array of types, or
+    of the types guessed from the block if types is `None` , and lists of
+    tuples on the columns they name, converted to types, or compared as
+    numbers if types is `None` .
+    """
+    if names is None:
+        names = ['f{}'.format(i) for i in range(values.shape[1])]
+    if callable(rowfilter):
+        if types is None:
+            types = _numerictypes([isfloat])
+        dtype = np.format_parser(formats=types, names=names,
+                                 titles=titles).dtype
+        return _rowmask(_numerictable([values], dtype), rowfilter)
+    if len(rowfilter) == 0:
+        return np.ones(len(values), dtype=bool)
+    chunk = {}
+    for name in _filtervalues(rowfilter):
+        if name not in names:
+            raise ValueError('no field of name {}'.format(name))
+        i = names.index(name)
+        chunk[name] = values[:, i]
+        if types is not None:
+            chunk[name] = chunk[name].astype(types[i])
+    return _rowmask(chunk, rowfilter)
+
+
+def _numericrecarray(file, types=None, names=None, titles=None,
+                     headerstring=None, buffer=False, usecols=None,
+                     rowfilter=None, numeric=None, output='recarray',
+                     numcols=None, checked=False):
+    """
+    returns the table read by `file2recarray` from a purely numeric table
+    delimited by whitespace, which is read in large blocks of lines, each
+    converted to numbers at once rather than a line at a time. Comments and
+    header lines are only looked for line by line in blocks having them.
+    Compressed data is not read.
+    Unless numeric is True, `None` is returned if any token is not a number,
+    which is first checked on the first line of data if numeric is `None` ,
+    and a ValueError is raised otherwise. If numcols is not None, lines must
+    have numcols numbers, and if checked is True, integers must be in the
+    range of their types. Only the columns in usecols are converted, and
+    rowfilter is applied to each block as it is read, as by `_numericmask` ,
+    keeping only the rows which pass it. `None` is also returned if types is
+    `None` and rowfilter compares columns with strings, which are compared
+    with the tokens by `_filterblocks` .
+    """
+    guessed = types is None
+    if (guessed and rowfilter is not None and not callable(rowfilter) and
+            any(isinstance(value, basestring)
+                for values in _filtervalues(rowfilter).itervalues()
+                for value in values)):
+        return None
+    useheaders = headerstring is not None and (names is None or
+                                               usecols is not None)
+    headers = []
+    counts = dict(bytes=0, lines=0, keptlines=0)
+    arrays = []
+    floats = []
+    with contextlib.closing(_openfile(file, buffer=buffer)) as fp:
+        if not hasattr(fp, 'read'):
+            # compressed data is read a line at a time
+            return None
+        texts = _textblocks(fp)
+
+        # Read up to the first line of data, so that the headers preceding
+        # it are known
+        first = None
+        for text in texts:
+            counts['bytes'] += len(text)
+            first, start = _firstdataline(text, headerstring=headerstring,
+                                          headers=headers)
+            if first is not None:
+                break
+            counts['lines'] += text.count('\n')
+        if first is None:
+            return None
+        if numeric is None and any(utils.guesstype(token)[0] == 'a20'
+                                   for token in first):
+            return None
+        names, usecols = _selectnames(headers, names, usecols,
+                                      useheaders=useheaders)
+        if numcols is not None and len(first) != numcols:
+            raise ValueError('The data has an inconsistent number of columns')
+        numcols = len(first)
+        counts['lines'] += text.count('\n', 0, start)
+        for i, text in enumerate(itertools.chain([text[start:]], texts)):
+            if i > 0:
+                counts['bytes'] += len(text)
+            counts['lines'] += text.count('\n')
+            if '#' in text or (headerstring is not None and
+                               headerstring in text):
+                with instrument.phase('filter'):
+                    text = _numericlines(text, headerstring=headerstring,
+                                         headers=headers)
+            parsed = _parsenumbers(text, numcols, usecols=usecols)
+            if parsed is None:
+                if numeric:
+                    raise ValueError('The data has tokens which are not '
+                                     'numbers')
+                return None
+            values, isfloat = parsed
+            if i == 0:
+                _checkfields(values.shape[1], types=types, names=names)
+            counts['keptlines'] += len(values)
+            if not guessed:
+                for j, t in enumerate(types):
+                    if np.dtype(t).kind in 'iu' and isfloat[:, j].any():
+                        raise ValueError('Strings in the array cannot be '
+                                         'converted to '
+                                         '{}'.format(np.dtype(t).str[1:]))
+            if rowfilter is not None:
+                with instrument.phase('filter'):
+                    mask = _numericmask(values, isfloat, rowfilter,
+                                        types=types, names=names,
+                                        titles=titles)
+                values = values[mask]
+                isfloat = isfloat[mask]
+            if len(values) > 0:
+                arrays.append(values)
+                floats.append(isfloat)
+    if useheaders:
+        _namesfromheaders(headers)
+    instrument.add(counts=counts)
+
+    if guessed:
+        if len(arrays) == 0:
+            raise ValueError('No lines of data were found')
+        types = _numerictypes(floats)
+    intcols = [i for i, t in enumerate(types) if np.dtype(t).kind in 'iu']
+    if any((np.abs(values[:, intcols]) >= _maxexactint).any()
+           for values in arrays):
+        # leave integers that floats do not keep to the general path
+        if numeric:
+            raise ValueError('The data has integers which are too large to '
+                             'be read as numbers')
+        return None
+    if checked:
+        for i in intcols:
+            info = np.iinfo(types[i])
+            if any(((values[:, i] < info.min) |
+                    (values[:, i] > info.max)).any() for values in arrays):
+                raise ValueError('Integers out of range')
+
+    arrdtypes = np.format_parser(formats=types, names=names,
+                                 titles=titles).dtype
+    table = _numerictable(arrays, arrdtypes, output=output)
+    numrows = sum(len(values) for values in arrays)
+    instrument.add(counts=dict(rows=numrows))
+    return table
+
+
 def file2recarray(file, types=None, names=None, titles=None, delimiter='',
                   headerstring=None, ignorestring=None, skiplines=0,
-                  datastring=None, buffer=False):
+                  datastring=None, buffer=False, cache=None, workers=1,
+                  sample=None, usecols=None, rowfilter=None,
+                  exactstrings=False, compact=False, categorical=None,
+                  output='recarray', numeric=None, schema=None):
     """
     creates a `numpy.recarray` from a file or buffer of consistent tabular data
     of heterogeneous types, by guessing the datatypes.
@@ -321,10 +1861,13 @@ def file2recarray(file, types=None, names=None, titles=None, delimiter='',
 
     Parameters
     ----------
-    file: string, mandatory
+    file: string or buffer, mandatory
         absolute path to file containing the data, or a string containing the
         data (with rows separated by new line characters). If file is not the
-        path to a file, then buffer must be true
+        path to a file, then buffer must be true. The data may also be in any
+        object supporting the buffer protocol, such as a `bytearray` ,
+        `mmap.mmap` or `memoryview` , which is read in place without being
+        copied, and must not be changed while it is read.
     buffer: optional, bool, defaults to False
         If file is a string rather than the path to a file, this must be true
     delimitter: string, optional, defaults to ''
@@ -335,20 +1878,103 @@ def file2recarray(file, types=None, names=None, titles=None, delimiter='',
         off.
     headerstring: string, optional, defaults to `None`
         string to denote lines containing variable names which will be used to
-        name fields
+        name fields. These are read in the same pass as the data, must
+        precede it, and must be consistent if there are several.
     ignorestring: string, optional, defaults to `None`
-        if not `None`, lines starting with this string will be ignored
+        string after which any line is ignored, instead of '#'
     names: list of strings, optional, defaults to `None`
         list of names of fields corresponding to stringarray
     types: list of variable types, optional, defaults to `None`
-        types of variables corresponding to fields or columns of stringarray
+        types of variables corresponding to fields or columns of stringarray.
+        If `None` , they are guessed from all the rows, and each block of
+        rows is converted to the types guessed so far as soon as it is read,
+        so that the blocks held take about the memory of the table, which
+        is held as well while it is assembled from them. Columns of numbers
+        that later rows turn into strings are read again from the file, and
+        rowfilter then applied to it again.
     titles: list of strings, optional, defaults to `None`
         alias for names of fields, as required by `np.format_parser`
+    cache: `basicio.cache.TableCache` or string, optional, defaults to `None`
+        if not `None` , a cache, or the path to the directory of a cache, in
+        which the table parsed from a file is stored, and from which it is
+        loaded as a read only `np.memmap` as long as the file and the
+        arguments are unchanged. Buffers are not cached.
+    workers: int, optional, defaults to 1
+        number of processes among which the parsing of a file is split, each
+        parsing a range of lines. Buffers are always parsed in a single
+        process.
+    sample: int, optional, defaults to `None`
+        if not `None` and types is `None` , the types are guessed from a
+        sample of rows as in `arraydtypes` , and columns having values that
+        do not fit them are promoted, as in `strarray2recarray`
+    usecols: list of ints or strings, optional, defaults to `None`
+        if not `None` , the only columns that are read, given by their indices
+        or by their names in the headers, in the order of the fields of the
+        output. Other columns are not converted. names and types are then
+        those of the columns read.
+    rowfilter: list of tuples or callable, optional, defaults to `None`
+        if not `None` , only rows passing the filter are kept, which is
+        applied to the file a chunk of rows at a time. The filter is either a
+        list of tuples (name, comparison, value) of the name of a field, one
+        of '<', '<=', '>', '>=', '==', '!=' or 'in', and a value or a
+        collection of values for 'in', which must all be true, or a callable
+        returning a boolean mask from a chunk given as a structured array
+        (which must be picklable if workers > 1). Chunks are converted to
+        types, or to the types guessed from the chunk if types is `None` , to
+        evaluate the filter. If types is `None` , the fields compared by a
+        list of tuples are instead compared as strings with values which are
+        strings, and as numbers otherwise, where values which are not
+        numbers never compare equal, whatever the types of the fields, so
+        that the comparisons are the same in every chunk. Tables filtered by
+        a callable are not cached.
+    exactstrings: bool, optional, defaults to False
+        if True and types is `None` , the types of columns of strings are as
+        wide as their longest string, rather than 'a20'
+    compact: bool, optional, defaults to False
+        if True and types is `None` , the types of numerical columns are the
+        smallest types keeping their values, as in `arraydtypes`
+    categorical: list of ints or strings, or True, optional, defaults to `None`
+        if not `None` , the fields, given by their indices or names, which
+        are stored as integer codes indexing the sorted array of their
+        distinct values, or if True, all the fields of strings for which
+        this takes less memory. The values are never truncated. Tables with
+        such fields are not cached.
+    output: string, optional, defaults to 'recarray'
+        if 'columns' , the table is returned as an ordered dictionary of
+        contiguous 1D arrays by field name, each one filled directly from
+        the data rather than from a structured array
+        Such tables are not cached.
+    numeric: bool, optional, defaults to `None`
+        if True, the table is known to have only numbers, delimited by
+        whitespace, which are then converted a large block of lines at a time
+        rather than tokenized line by line, and a ValueError is raised if it
+        has other tokens. If `None` , this is tried if the first line of data
+        has only numbers, falling back to parsing line by line if the table
+        has other tokens. If False, the table is always parsed line by line.
+        This is only done for uncompressed data with the default delimiter,
+        without datastring, ignorestring, categorical or compact, and types,
+        if given, must be numbers. workers and sample are then not used.
+        Only the columns in usecols are converted, and rowfilter is applied
+        to each block of lines as it is converted, so that only the rows
+        kept are held, as on the path parsing line by line.
+    schema: `basicio.schema.Schema` , optional, defaults to `None`
+        if not `None` , the names, types, delimiter, datastring, headerstring
+        and ignorestring of the table, which are used instead of those
+        arguments, so that types are not guessed and header lines are skipped
+        without being read. names and types must then not be given, and
+        usecols are columns of the schema. Every row is checked against the
+        schema, and a ValueError giving the first row which has another
+        number of columns, or a value which does not fit the type of its
+        field, is raised as soon as the rows around it are read. workers is
+        then not used.
 
 
     Returns
     -------
-    `np.recarray` or structured array
+    `np.recarray` or structured array, or `collections.OrderedDict` of
+    arrays if output is 'columns' , or if categorical is not `None` , the
+    tuple of the table and the dictionary of the arrays of values of the
+    encoded fields by name
 
 
     Examples
@@ -358,15 +1984,896 @@ def file2recarray(file, types=None, names=None, titles=None, delimiter='',
     >>> x['f0'][0] == '6773'
     True
     >>> np.testing.assert_almost_equal(x['f1'][0], 0.089300)
+    >>> import tempfile, shutil
+    >>> cachedir = tempfile.mkdtemp()
+    >>> y = file2recarray(fname, cache=cachedir)
+    >>> z = file2recarray(fname, cache=cachedir)
+    >>> isinstance(z, np.memmap)
+    True
+    >>> (x == y).all() and (x == z).all()
+    True
+    >>> shutil.rmtree(cachedir)
+    >>> w = file2recarray(fname, workers=3)
+    >>> w.dtype == x.dtype and (w == x).all()
+    True
+    >>> s = file2recarray(fname, sample=4)
+    >>> s.dtype == x.dtype and (s == x).all()
+    True
+    >>> u = file2recarray(fname, usecols=[9, 0])
+    >>> u.dtype.names
+    ('f0', 'f1')
+    >>> (u['f0'] == x['f9']).all() and (u['f1'] == x['f0']).all()
+    True
+    >>> fname = os.path.join(_here, 'example_data/singleheader_data.dat')
+    >>> file2recarray(fname, headerstring='#', usecols=['mu', 'SNID'])
+    array([(45., 23), (41., 12)], dtype=[('mu', '<f4'), ('SNID', '<i8')])
+    >>> file2recarray(fname, headerstring='#', rowfilter=[('z', '<', 0.8)])
+    array([(12, 0.6, 41.)],
+          dtype=[('SNID', '<i8'), ('z', '<f4'), ('mu', '<f4')])
+    >>> file2recarray(fname, headerstring='#',
+    ...               rowfilter=lambda x: x['SNID'] > 20)['SNID']
+    array([23])
+    >>> ids = [str(i) for i in range(70000)] + ['03D1ba', '6773']
+    >>> buf = ''.join(snid + ' 0.5\\n' for snid in ids)
+    >>> file2recarray(buf, buffer=True, names=['SNID', 'z'],
+    ...               rowfilter=[('SNID', '==', '6773')])['SNID']
+    array([6773, 6773])
+    >>> x = file2recarray(''.join(['+7 1\\n'] * 10000 + ['7b 2.5\\n']),
+    ...                   buffer=True)
+    >>> x.dtype.descr
+    [('f0', '|S20'), ('f1', '<f4')]
+    >>> x['f0'][[0, -1]], x['f1'][[0, -1]]
+    (array(['+7', '7b'], dtype='|S20'), array([1. , 2.5], dtype=float32))
+    >>> file2recarray('@ SNID z\\n1 0.5\\n2 0.7\\n', buffer=True,
+    ...               headerstring='@').dtype.names
+    ('SNID', 'z')
+    >>> buf = '@ SNID band\\nSN2003lm g\\nSN2003lm r\\nSN1997ff g\\n'
+    >>> file2recarray(buf, buffer=True, headerstring='@', exactstrings=True)
+    array([('SN2003lm', 'g'), ('SN2003lm', 'r'), ('SN1997ff', 'g')],
+          dtype=[('SNID', 'S8'), ('band', 'S1')])
+    >>> x, categories = file2recarray(buf, buffer=True, headerstring='@',
+    ...                               categorical=['band'])
+    >>> x['band']
+    array([0, 1, 0], dtype=int8)
+    >>> categories['band'][x['band']]
+    array(['g', 'r', 'g'], dtype='|S1')
+    >>> file2recarray(buf, buffer=True, headerstring='@', output='columns')
+    OrderedDict([('SNID', array(['SN2003lm', 'SN2003lm', 'SN1997ff'], dtype='|S20')), ('band', array(['g', 'r', 'g'], dtype='|S20'))])
+    >>> buf = '@ z mu\\n0.5 42.1\\n# comment\\n1 44.0 # bright\\n'
+    >>> file2recarray(buf, buffer=True, headerstring='@', numeric=True)
+    array([(0.5, 42.1), (1. , 44. )], dtype=[('z', '<f4'), ('mu', '<f4')])
+    >>> buf = '1 0.5\\n2 0.7\\n3 0.9\\n'
+    >>> file2recarray(buf, buffer=True, output='columns',
+    ...               rowfilter=lambda x: x['f0'] < 3)
+    OrderedDict([('f0', array([1, 2])), ('f1', array([0.5, 0.7], dtype=float32))])
     """
-    d = file2strarray(file, buffer=buffer, delimitter=delimiter,
-                      datastring=datastring)
-    if names is None and headerstring is not None:
-        names = getheaders(file, headerstring=headerstring)
-    recarray = strarray2recarray(d, names=names, types=types, titles=titles)
+    if schema is not None:
+        if types is not None or names is not None:
+            raise ValueError('types and names cannot be given with a schema')
+        delimiter, datastring = schema.delimiter, schema.datastring
+        headerstring, ignorestring = schema.headerstring, schema.ignorestring
+        names, types = list(schema.names), list(schema.types)
+        numcols = len(names)
+        usecols = _resolveusecols(usecols, names)
+        if usecols is not None:
+            names = [names[i] for i in usecols]
+            types = [types[i] for i in usecols]
+    if callable(rowfilter) or categorical is not None or output != 'recarray':
+        cache = None
+    if cache is not None and not buffer:
+        if not isinstance(cache, TableCache):
+            cache = TableCache(cache)
+        key = cache.key(file, types=types, names=names, titles=titles,
+                        delimiter=delimiter, headerstring=headerstring,
+                        ignorestring=ignorestring, datastring=datastring,
+                        sample=sample, usecols=usecols, rowfilter=rowfilter,
+                        exactstrings=exactstrings, compact=compact,
+                        numeric=numeric, schema=schema)
+        recarray = cache.get(key)
+        if recarray is not None:
+            instrument.add(counts=dict(rows=len(recarray)))
+            return recarray
+
+    if (numeric is not False and delimiter == '' and datastring is None and
+            ignorestring is None and categorical is None and not compact and
+            (types is None or all(np.dtype(t).kind in 'iuf' for t in types))):
+        try:
+            recarray = _numericrecarray(file, types=types, names=names,
+                                        titles=titles,
+                                        headerstring=headerstring,
+                                        buffer=buffer, usecols=usecols,
+                                        rowfilter=rowfilter, numeric=numeric,
+                                        output=output,
+                                        numcols=(None if schema is None else
+                                                 numcols),
+                                        checked=schema is not None)
+        except ValueError:
+            if schema is None:
+                raise
+            # the rows are checked again to find the first one not fitting
+            recarray = None
+        if recarray is not None:
+            if cache is not None and not buffer:
+                cache.put(key, recarray)
+            return recarray
+
+    # The headers are collected in the same pass as the data, and the names
+    # they give are validated at the end if they are used
+    useheaders = schema is None and headerstring is not None and (
+        names is None or usecols is not None)
+    headers = []
+    fp = _openfile(file, buffer=buffer)
+    tokens = _datatokens(fp, delimitter=delimiter, datastring=datastring,
+                         ignorestring=ignorestring, headerstring=headerstring,
+                         headers=headers)
+
+    # Read up to the first line of data, so that the headers preceding it
+    # are known
+    first = next(tokens, None)
+    if first is not None:
+        tokens = itertools.chain([first], tokens)
+    names, usecols = _selectnames(headers, names, usecols,
+                                  useheaders=useheaders)
+
+    if (workers > 1 and schema is None and not buffer and
+            _filecompression(file) is None):
+        fp.close()
+        guessed = types is None
+        # encoded columns are parsed as whole strings
+        wholestrings = exactstrings or categorical is not None
+        blocks, types, headers = _parallelblocks(file, workers, types=types,
+                                                 delimiter=delimiter,
+                                                 datastring=datastring,
+                                                 ignorestring=ignorestring,
+                                                 headerstring=headerstring,
+                                                 sample=sample,
+                                                 usecols=usecols,
+                                                 rowfilter=rowfilter,
+                                                 names=names,
+                                                 exactstrings=wholestrings,
+                                                 compact=compact)
+        if guessed and not exactstrings:
+            types = ['a20' if np.dtype(t).kind == 'S' else t for t in types]
+    else:
+        dtype = None
+        if types is not None:
+            dtype = np.format_parser(formats=types, names=None,
+                                     titles=None).dtype
+
+        # tokenize straight into blocks of columns, converted as they are
+        # read if the types are known, to avoid holding a 2D array of strings
+        if schema is None:
+            blocks = _columnblocks(tokens, chunksize=_batchsize, dtype=dtype,
+                                   usecols=usecols)
+        else:
+            dtype = np.format_parser(formats=types, names=names,
+                                     titles=None).dtype
+            blocks = _schemablocks(tokens, dtype, numcols,
+                                   chunksize=_batchsize, usecols=usecols)
+        if rowfilter is not None:
+            blocks = _filterblocks(blocks, rowfilter, names=names,
+                                   types=types)
+        if (types is None and sample is None and not exactstrings and
+                not compact and categorical is None):
+            # types guessed from all the rows are provisional until the last
+            # block, whose strings are converted as they are read
+            tokenargs = dict(delimitter=delimiter, datastring=datastring,
+                             ignorestring=ignorestring,
+                             headerstring=headerstring)
+            reread = lambda numblocks: itertools.islice(
+                _rereadblocks(file, buffer=buffer, tokenargs=tokenargs,
+                              usecols=usecols, rowfilter=rowfilter,
+                              names=names), numblocks)
+            blocks, types = _typedblocks(blocks, reread)
+        else:
+            blocks = list(blocks)
+        fp.close()
+    if useheaders:
+        _namesfromheaders(headers)
+    instrument.add(counts=dict(rows=sum(len(block[0]) for block in blocks)))
+    if categorical is not None:
+        categories = {}
+        recarray = _blocks2recarray(blocks, names=names, types=types,
+                                    titles=titles, sample=sample,
+                                    exactstrings=exactstrings,
+                                    compact=compact, categorical=categorical,
+                                    categories=categories, output=output)
+        return recarray, categories
+    recarray = _blocks2recarray(blocks, names=names, types=types,
+                                titles=titles, sample=sample,
+                                exactstrings=exactstrings, compact=compact,
+                                output=output)
+    if cache is not None and not buffer:
+        cache.put(key, recarray)
     return recarray
 
 
+def iter_file2recarray(file, chunksize=_chunksize, types=None, names=None,
+                       titles=None, delimiter='', headerstring=None,
+                       ignorestring=None, datastring=None, buffer=False,
+                       usecols=None, rowfilter=None, output='recarray'):
+    """
+    generator yielding the tabular data in a file or buffer as a sequence of
+    structured arrays of at most chunksize rows, so that files larger than
+    the available memory can be processed. Unless types are supplied, they
+    are guessed from the first chunk and then kept fixed for the rest of the
+    file.
+
+
+    Parameters
+    ----------
+    file: string or buffer, mandatory
+        absolute path to file containing the data, or a string containing the
+        data (with rows separated by new line characters). If file is not the
+        path to a file, then buffer must be true. The data may also be in any
+        object supporting the buffer protocol, such as a `bytearray` ,
+        `mmap.mmap` or `memoryview` , which is read in place without being
+        copied, and must not be changed while it is read.
+    chunksize: int, optional, defaults to 65536
+        maximal number of rows in each structured array yielded
+    types: list of variable types, optional, defaults to `None`
+        types of variables corresponding to fields or columns of the data. If
+        `None` , these are guessed from the first chunk
+    names: list of strings, optional, defaults to `None`
+        list of names of fields corresponding to the columns
+    titles: list of strings, optional, defaults to `None`
+        alias for names of fields, as required by `np.format_parser`
+    delimiter: string, optional, defaults to ''
+        type of delimitter used in the file
+    headerstring: string, optional, defaults to `None`
+        string to denote lines containing variable names which will be used to
+        name fields. These lines must precede the data.
+    ignorestring: string, optional, defaults to `None`
+        string after which any line is ignored
+    datastring: string, optional, defaults to `None`
+        if not none, assume that all lines containing data are prepended by
+        this string; therefore select only such lines, and strip this character
+        off.
+    buffer: optional, bool, defaults to False
+        If file is a string rather than the path to a file, this must be true
+    usecols: list of ints or strings, optional, defaults to `None`
+        if not `None` , the only columns that are read, as in `file2recarray`
+    rowfilter: list of tuples or callable, optional, defaults to `None`
+        if not `None` , only rows passing the filter are kept, as in
+        `file2recarray` , and chunks without such rows are not yielded. A
+        callable is given each chunk in the format of output.
+    output: string, optional, defaults to 'recarray'
+        if 'columns' , each chunk is an ordered dictionary of contiguous 1D
+        arrays by field name, as in `file2recarray`
+
+
+    Returns
+    -------
+    generator of `np.recarray` or structured arrays, all of the same dtype,
+    or of `collections.OrderedDict` of arrays if output is 'columns'
+
+
+    Examples
+    --------
+    >>> fname = os.path.join(_here,'example_data/table_data.dat')
+    >>> chunks = list(iter_file2recarray(fname, chunksize=40))
+    >>> [len(chunk) for chunk in chunks]
+    [40, 40, 16]
+    >>> x = file2recarray(fname)
+    >>> all(chunk.dtype == x.dtype for chunk in chunks)
+    True
+    >>> (np.concatenate(chunks) == x).all()
+    True
+    >>> fname = os.path.join(_here,'example_data/singleheader_data.dat')
+    >>> next(iter_file2recarray(fname, headerstring='#')).dtype.names
+    ('SNID', 'z', 'mu')
+    >>> next(iter_file2recarray(fname, headerstring='#', usecols=['z'])).dtype
+    dtype([('z', '<f4')])
+    >>> next(iter_file2recarray(fname, headerstring='#', output='columns',
+    ...                         rowfilter=[('mu', '>', 42)]))
+    OrderedDict([('SNID', array([23])), ('z', array([1.], dtype=float32)), ('mu', array([45.], dtype=float32))])
+
+
+    .. note:: Since the types are fixed by the first chunk, a ValueError is \
+    raised if a later chunk has values that cannot be converted to them, eg. \
+    strings in a column of integers.
+    """
+    headers = []
+    fp = _openfile(file, buffer=buffer)
+    try:
+        tokens = _datatokens(fp, delimitter=delimiter, datastring=datastring,
+                             ignorestring=ignorestring,
+                             headerstring=headerstring, headers=headers)
+
+        # Read up to the first line of data, so that the headers preceding
+        # it are known
+        first = next(tokens, None)
+        if first is None:
+            return
+        tokens = itertools.chain([first], tokens)
+        names, usecols = _selectnames(headers, names, usecols)
+
+        blocks = _columnblocks(tokens, chunksize=chunksize, usecols=usecols)
+        for i, block in enumerate(blocks):
+            # fix the types with the first chunk
+            if i == 0 and types is None:
+                types = [utils.guessarraytype(col) for col in block]
+            numrows = len(block[0])
+            chunk = _blocks2recarray([block], names=names, types=types,
+                                     titles=titles, output=output)
+            if rowfilter is not None:
+                mask = _rowmask(chunk, rowfilter)
+                numrows = int(mask.sum())
+                if numrows == 0:
+                    continue
+                if output == 'columns':
+                    chunk = collections.OrderedDict((name, col[mask])
+                                                    for name, col in
+                                                    chunk.iteritems())
+                else:
+                    chunk = chunk[mask]
+            instrument.add(counts=dict(rows=numrows))
+            yield chunk
+    finally:
+        fp.close()
+
+
+def buildlineindex(fname, delimiter='', datastring=None, ignorestring=None,
+                   headerstring=None, indexfile=None):
+    """
+    returns the byte offsets of the lines of data in a file, which are the
+    lines selected by the rules of `file2strarray` , so that rows of the
+    table can later be read with `read_rows` or `read_slice` without parsing
+    the lines before them.
+
+
+    Parameters
+    ----------
+    fname: string, mandatory
+        absolute path to file containing the data
+    delimiter: string, optional, defaults to ''
+        type of delimitter used in the file
+    datastring: string, optional, defaults to `None`
+        if not none, assume that all lines containing data are prepended by
+        this string
+    ignorestring: string, optional, defaults to `None`
+        string after which any line is ignored
+    headerstring: string, optional, defaults to `None`
+        string to denote lines containing variable names, which are not data
+    indexfile: string, optional, defaults to `None`
+        if not `None` , absolute path to a file in which the index is saved
+        along with the size and modification time of fname, to be loaded by
+        `loadlineindex`
+
+
+    Returns
+    -------
+    `np.ndarray` of byte offsets of type `np.int64`
+
+
+    Examples
+    --------
+    >>> fname = os.path.join(_here,'example_data/table_data_ps.dat')
+    >>> buildlineindex(fname, datastring='SN:')
+    array([ 245, 1232])
+    """
+    if _filecompression(fname) is not None:
+        raise ValueError('Compressed files cannot be indexed')
+    offsets = []
+    offset = 0
+    with open(fname, 'rb') as fp:
+        for line in fp:
+            lst = _linetokens(line, delimitter=delimiter,
+                              datastring=datastring, ignorestring=ignorestring,
+                              headerstring=headerstring)
+            if len(lst) > 0:
+                offsets.append(offset)
+            offset += len(line)
+    offsets = np.array(offsets, dtype=np.int64)
+
+    if indexfile is not None:
+        stat = os.stat(fname)
+        with open(indexfile, 'wb') as fp:
+            np.savez(fp, offsets=offsets, size=stat.st_size,
+                     mtime=stat.st_mtime)
+    return offsets
+
+
+def loadlineindex(indexfile, fname=None):
+    """
+    loads an index of the lines of data of a file saved by `buildlineindex`
+
+
+    Parameters
+    ----------
+    indexfile: string, mandatory
+        absolute path to the file in which the index was saved
+    fname: string, optional, defaults to `None`
+        if not `None` , absolute path to the indexed file, and a ValueError is
+        raised if it has changed since the index was built
+
+
+    Returns
+    -------
+    `np.ndarray` of byte offsets of type `np.int64`
+
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> fname = os.path.join(_here,'example_data/table_data.dat')
+    >>> fd, indexfile = tempfile.mkstemp(suffix='.npz')
+    >>> offsets = buildlineindex(fname, indexfile=indexfile)
+    >>> (loadlineindex(indexfile, fname) == offsets).all()
+    True
+    >>> os.remove(indexfile)
+    """
+    with np.load(indexfile) as data:
+        offsets = data['offsets']
+        size = data['size']
+        mtime = data['mtime']
+    if fname is not None:
+        stat = os.stat(fname)
+        if stat.st_size != size or stat.st_mtime != mtime:
+            raise ValueError('The file {} has changed since the index {} was '
+                             'built'.format(fname, indexfile))
+    return offsets
+
+
+def _getlineindex(fname, index, delimiter, datastring, ignorestring,
+                  headerstring):
+    """
+    returns the index of lines of data given as index to `read_rows` and
+    `read_slice`
+    """
+    if index is None:
+        return buildlineindex(fname, delimiter=delimiter,
+                              datastring=datastring, ignorestring=ignorestring,
+                              headerstring=headerstring)
+    if isinstance(index, basestring):
+        return loadlineindex(index, fname)
+    return np.asarray(index)
+
+
+def _leadingnames(fname, end, headerstring, ignorestring=None):
+    """
+    returns the variable names on the header lines in the first end bytes of
+    the file fname
+    """
+    headers = []
+    with open(fname, 'rb') as fp:
+        for line in cStringIO.StringIO(fp.read(end)):
+            line = line.strip()
+            if line.startswith(headerstring):
+                headers.append(_headertokens(line, headerstring,
+                                             ignorestring=ignorestring))
+    return _namesfromheaders(headers)
+
+
+def _indexedrecarray(fname, rows, offsets, types, names, titles,
+                     headerstring, ignorestring, output='recarray'):
+    """
+    returns the structured array, or dictionary of columns if output is
+    'columns' , of the list of token lists rows, with names read from the
+    header lines preceding the first line of data if needed
+    """
+    if names is None and headerstring is not None and len(offsets) > 0:
+        names = _leadingnames(fname, offsets[0], headerstring,
+                              ignorestring=ignorestring)
+    blocks = list(_columnblocks(rows))
+    instrument.add(counts=dict(rows=len(rows)))
+    return _blocks2recarray(blocks, names=names, types=types, titles=titles,
+                            output=output)
+
+
+def read_rows(fname, rows, index=None, types=None, names=None, titles=None,
+              delimiter='', headerstring=None, ignorestring=None,
+              datastring=None, output='recarray'):
+    """
+    reads selected rows of the tabular data in a file into a structured
+    array, parsing only the lines of those rows by seeking to them with an
+    index of the lines of data.
+
+
+    Parameters
+    ----------
+    fname: string, mandatory
+        absolute path to file containing the data
+    rows: sequence of ints, mandatory
+        numbers of the rows to read, starting from 0, in the order in which
+        they should appear in the output
+    index: `np.ndarray` or string, optional, defaults to `None`
+        index of the lines of data returned by `buildlineindex` , or the
+        path to the file in which it was saved. If `None` , the index is
+        built, which requires a scan of the whole file.
+    types: list of variable types, optional, defaults to `None`
+        types of variables corresponding to fields or columns. If `None` ,
+        they are guessed from the rows read only.
+    names: list of strings, optional, defaults to `None`
+        list of names of fields corresponding to the columns
+    titles: list of strings, optional, defaults to `None`
+        alias for names of fields, as required by `np.format_parser`
+    delimiter, headerstring, ignorestring, datastring: optional
+        as in `file2recarray` , and the same as used to build the index
+    output: string, optional, defaults to 'recarray'
+        if 'columns' , the rows are returned as an ordered dictionary of
+        contiguous 1D arrays by field name, as in `file2recarray`
+
+
+    Returns
+    -------
+    `np.recarray` or structured array, or `collections.OrderedDict` of
+    arrays if output is 'columns'
+
+
+    Examples
+    --------
+    >>> fname = os.path.join(_here,'example_data/table_data.dat')
+    >>> x = file2recarray(fname)
+    >>> offsets = buildlineindex(fname)
+    >>> y = read_rows(fname, [90, 3, 4], index=offsets, types=x.dtype)
+    >>> (y == x[[90, 3, 4]]).all()
+    True
+    >>> fname = os.path.join(_here,'example_data/singleheader_data.dat')
+    >>> read_rows(fname, [1], headerstring='#').dtype.names
+    ('SNID', 'z', 'mu')
+    """
+    offsets = _getlineindex(fname, index, delimiter, datastring,
+                            ignorestring, headerstring)
+    tokens = []
+    with open(fname, 'rb') as fp:
+        for row in rows:
+            fp.seek(offsets[row])
+            tokens.append(_linetokens(fp.readline(), delimitter=delimiter,
+                                      datastring=datastring,
+                                      ignorestring=ignorestring,
+                                      headerstring=headerstring))
+    return _indexedrecarray(fname, tokens, offsets, types, names, titles,
+                            headerstring, ignorestring, output=output)
+
+
+def read_slice(fname, start, stop, index=None, types=None, names=None,
+               titles=None, delimiter='', headerstring=None,
+               ignorestring=None, datastring=None, output='recarray'):
+    """
+    reads the rows start to stop (excluding stop) of the tabular data in a
+    file into a structured array, parsing only the lines from the row start
+    onwards by seeking to it with an index of the lines of data. The
+    parameters are those of `read_rows` , and start and stop follow the
+    conventions of python slices.
+
+
+    Returns
+    -------
+    `np.recarray` or structured array, or `collections.OrderedDict` of
+    arrays if output is 'columns'
+
+
+    Examples
+    --------
+    >>> fname = os.path.join(_here,'example_data/table_data.dat')
+    >>> x = file2recarray(fname)
+    >>> y = read_slice(fname, 50, 60, types=x.dtype)
+    >>> (y == x[50:60]).all()
+    True
+    >>> len(read_slice(fname, -5, None, types=x.dtype))
+    5
+    """
+    offsets = _getlineindex(fname, index, delimiter, datastring,
+                            ignorestring, headerstring)
+    start, stop, step = slice(start, stop).indices(len(offsets))
+    tokens = []
+    if stop > start:
+        with open(fname, 'rb') as fp:
+            fp.seek(offsets[start])
+            lines = _datatokens(fp, delimitter=delimiter,
+                                datastring=datastring,
+                                ignorestring=ignorestring,
+                                headerstring=headerstring)
+            tokens = list(itertools.islice(lines, stop - start))
+    return _indexedrecarray(fname, tokens, offsets, types, names, titles,
+                            headerstring, ignorestring, output=output)
+
+
+def _parsefile(args):
+    """
+    parses the tabular data in a file into columns named by their headers,
+    for `files2recarray` . args is the tuple (fname, schema, headerstring,
+    kwargs), where schema is a dictionary of the types of columns by name
+    and kwargs are passed to `_datatokens` . Columns whose names are not in
+    schema, or whose values do not fit the type in schema, have their types
+    guessed and promoted. Returns a tuple (names, types, columns).
+    """
+    fname, schema, headerstring, kwargs = args
+    headers = []
+    fp = _openfile(fname)
+    blocks = list(_columnblocks(_datatokens(fp, headerstring=headerstring,
+                                            headers=headers, **kwargs)))
+    fp.close()
+    if len(blocks) == 0:
+        return [], [], []
+    numcols = len(blocks[0])
+    names = _namesfromheaders(headers)
+    if names is None:
+        names = ['f{}'.format(i) for i in range(numcols)]
+    if len(names) != numcols:
+        raise ValueError('The file {} has {} columns and {} variable names'
+                         ''.format(fname, numcols, len(names)))
+
+    types = []
+    columns = []
+    for i, name in enumerate(names):
+        col = np.concatenate([block[i] for block in blocks])
+        for block in blocks:
+            block[i] = None
+        t = schema.get(name)
+        guessed = t is None
+        if guessed:
+            t = utils.guessarraytype(col)
+        try:
+            typed = utils.castarray(col, t, checked=guessed)
+        except ValueError:
+            t = utils.promotetypes([t, utils.guessarraytype(col)])
+            typed = utils.castarray(col, t)
+        types.append(t)
+        columns.append(typed)
+    return names, types, columns
+
+
+def _fillvalue(dtype):
+    """
+    returns the value filling a field of type dtype in the rows of a file
+    which does not have the field
+    """
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind in 'SU':
+        return ''
+    return 0
+
+
+def files2recarray(files, workers=1, types=None, headerstring=None,
+                   delimiter='', ignorestring=None, datastring=None,
+                   sourcename='fileindex'):
+    """
+    creates a single `numpy.recarray` from the tabular data in many files,
+    which are parsed concurrently in a pool of processes. The columns of the
+    files are matched by the variable names in their headers, and the rows
+    of each file are marked by the index of the file.
+
+
+    Parameters
+    ----------
+    files: list of strings, or string, mandatory
+        absolute paths to the files, or a glob pattern matching them, in
+        which case the files are sorted by path
+    workers: int, optional, defaults to 1
+        number of processes parsing files
+    types: dictionary, optional, defaults to `None`
+        types of variables keyed by the variable names. Unless it is
+        supplied, the types are guessed from the first file and are then
+        used for all the files, promoting the types of columns of files
+        having values that do not fit.
+    headerstring: string, optional, defaults to `None`
+        string to denote lines containing variable names. If `None` , the
+        columns are matched by position, and named 'f0', 'f1', ...
+    delimiter: string, optional, defaults to ''
+        type of delimitter used in the files
+    ignorestring: string, optional, defaults to `None`
+        string after which any line is ignored
+    datastring: string, optional, defaults to `None`
+        if not none, assume that all lines containing data are prepended by
+        this string
+    sourcename: string, optional, defaults to 'fileindex'
+        name of the field holding the index of the file of each row in files
+
+
+    Returns
+    -------
+    `np.recarray` or structured array, of the fields found in any of the
+    files in the order in which they are first found and the field
+    sourcename. The fields a file does not have are filled with nan for
+    floats, 0 for integers and empty strings.
+
+
+    Examples
+    --------
+    >>> fnames = [os.path.join(_here,'example_data/singleheader_data.dat'),
+    ...           os.path.join(_here,'example_data/singleheader_concatdata.dat')]
+    >>> x = files2recarray(fnames, headerstring='#', workers=2)
+    >>> x.dtype.names
+    ('SNID', 'z', 'mu', 'fileindex')
+    >>> len(x) == sum(len(file2recarray(fname)) for fname in fnames)
+    True
+    >>> list(x['fileindex'][:3])
+    [0, 0, 1]
+    >>> fname = os.path.join(_here,'example_data/table_data.dat')
+    >>> y = files2recarray(fname)
+    >>> (y[list(file2recarray(fname).dtype.names)] == file2recarray(fname)).all()
+    True
+    """
+    if isinstance(files, basestring):
+        files = sorted(glob.glob(files))
+    kwargs = dict(delimitter=delimiter, datastring=datastring,
+                  ignorestring=ignorestring)
+
+    # Infer the schema once, from the first file
+    schema = {}
+    results = []
+    if types is not None:
+        schema = dict(types)
+    elif len(files) > 0:
+        results = [_parsefile((files[0], schema, headerstring, kwargs))]
+        schema = dict(zip(results[0][0], results[0][1]))
+
+    if workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        mapper = pool.map
+    else:
+        pool = None
+        mapper = map
+    try:
+        results += mapper(_parsefile, [(fname, schema, headerstring, kwargs)
+                                       for fname in files[len(results):]])
+
+        # Reconcile the names and types of the columns of all the files
+        names = []
+        for fnames, ftypes, columns in results:
+            for name, t in zip(fnames, ftypes):
+                if name not in schema:
+                    schema[name] = t
+                schema[name] = utils.promotetypes([schema[name], t])
+                if name not in names:
+                    names.append(name)
+
+        # Files whose columns were converted to less general types
+        redo = [i for i, (fnames, ftypes, columns) in enumerate(results)
+                if any(schema[name] != t for name, t in zip(fnames, ftypes))]
+        redone = mapper(_parsefile, [(files[i], schema, headerstring, kwargs)
+                                     for i in redo])
+        for i, res in zip(redo, redone):
+            results[i] = res
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    dtype = np.dtype([(name, schema[name]) for name in names] +
+                     [(sourcename, 'i8')])
+    numrows = sum(len(columns[0]) for fnames, ftypes, columns in results
+                  if len(columns) > 0)
+    a = np.empty(numrows, dtype=dtype)
+    start = 0
+    for i, (fnames, ftypes, columns) in enumerate(results):
+        if len(columns) == 0:
+            continue
+        stop = start + len(columns[0])
+        for name in names:
+            if name in fnames:
+                a[name][start:stop] = columns[fnames.index(name)]
+            else:
+                a[name][start:stop] = _fillvalue(dtype[name])
+        a[sourcename][start:stop] = i
+        start = stop
+    instrument.add(counts=dict(rows=numrows))
+    return a
+
+
+def _writablefile(fname, compression=None):
+    """
+    returns a file object open for writing to the path fname, which
+    compresses the data written if compression is 'gz', 'bz2' or 'xz'
+    """
+    if compression is None:
+        return open(fname, 'wb')
+    if compression == 'gz':
+        return gzip.open(fname, 'wb')
+    if compression == 'bz2':
+        return bz2.BZ2File(fname, 'wb')
+    if compression == 'xz':
+        return _lzma().LZMAFile(fname, 'wb')
+    raise ValueError('Unknown compression {}'.format(compression))
+
+
+def _formatcolumn(col, fmt=None):
+    """
+    returns the 1D array col formatted as an array of strings, with the %
+    format fmt if it is not None, and otherwise with the shortest strings
+    that are read back as the same values
+    """
+    if fmt is not None:
+        return np.char.mod(fmt, col)
+    if col.dtype.kind in 'SU':
+        return col
+    return col.astype(np.string_)
+
+
+def recarray2file(recarray, fname, headerstring=None, datastring=None,
+                  delimiter=' ', compression=None, formats=None,
+                  chunksize=_chunksize):
+    """
+    writes a structured array, or a dictionary of columns, to a file of
+    tabular data that can be read by `file2recarray` . The columns are
+    formatted a chunk of rows at a time, with vectorized conversions of whole
+    columns to strings rather than formatting each row.
+
+
+    Parameters
+    ----------
+    recarray: `np.recarray` , structured array or dictionary, mandatory
+        table to write, or ordered dictionary of 1D arrays of the same length
+        by name, as returned by the readers with output 'columns'
+    fname: string, mandatory
+        absolute path to the file written
+    headerstring: string, optional, defaults to `None`
+        if not `None` , the names of the fields are written on a header line
+        starting with headerstring, before the data
+    datastring: string, optional, defaults to `None`
+        if not `None` , string prepended to every line of data, followed by
+        a space
+    delimiter: string, optional, defaults to ' '
+        string separating the values on a line
+    compression: string, optional, defaults to `None`
+        if 'gz', 'bz2' or 'xz' (which requires the lzma module), the file is
+        compressed accordingly
+    formats: dictionary, optional, defaults to `None`
+        % formats of some of the fields by name, eg. {'mu': '%.3f'} . Other
+        fields are written with the shortest strings which are read back as
+        the same values.
+    chunksize: int, optional, defaults to 65536
+        number of rows formatted at a time
+
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> fname = os.path.join(_here, 'example_data/singleheader_data.dat')
+    >>> x = file2recarray(fname, headerstring='#')
+    >>> fd, outfile = tempfile.mkstemp(suffix='.dat.gz')
+    >>> recarray2file(x, outfile, headerstring='#', datastring='SN:',
+    ...               compression='gz')
+    >>> y = file2recarray(outfile, headerstring='#', datastring='SN:')
+    >>> y.dtype == x.dtype and (y == x).all()
+    True
+    >>> recarray2file(x, outfile, formats={'z': '%.2f'})
+    >>> print open(outfile).read(),
+    23 1.00 45.0
+    12 0.60 41.0
+    >>> x = np.array([('SN2003lm', 0.5), ('1997ff', 1.7)],
+    ...              dtype=[('SNID', 'S8'), ('z', 'f4')])
+    >>> recarray2file(x, outfile, datastring='SN:')
+    >>> print open(outfile).read(),
+    SN: SN2003lm 0.5
+    SN: 1997ff 1.7
+    >>> file2recarray(outfile, datastring='SN:')['f0']
+    array(['SN2003lm', '1997ff'], dtype='|S20')
+    >>> os.remove(outfile)
+
+
+    .. note:: Strings are written as they are, so that strings which are \
+    empty or contain the delimiter or whitespace cannot be read back.
+    """
+    if isinstance(recarray, dict):
+        names = list(recarray.keys())
+        columns = [np.asarray(recarray[name]) for name in names]
+    else:
+        names = list(recarray.dtype.names)
+        columns = [recarray[name] for name in names]
+    if formats is None:
+        formats = {}
+    numrows = len(columns[0]) if len(columns) > 0 else 0
+    # the space keeps the reader, which strips the characters of datastring
+    # from the start of lines, from stripping those of the first value
+    prefix = '' if datastring is None else datastring + ' '
+
+    with contextlib.closing(_writablefile(fname, compression)) as fp:
+        if headerstring is not None:
+            fp.write(headerstring + ' ' + ' '.join(names) + '\n')
+        for start in range(0, numrows, chunksize):
+            stop = start + chunksize
+            strings = [_formatcolumn(col[start:stop],
+                                     formats.get(name)).tolist()
+                       for name, col in zip(names, columns)]
+            lines = itertools.imap(delimiter.join, itertools.izip(*strings))
+            fp.write(prefix + ('\n' + prefix).join(lines) + '\n')
+
+
 if __name__ == '__main__':
     pass
     # fname = os.path.join(_here,'example_data/table_data.dat')
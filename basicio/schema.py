@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+import numpy as np
+import json
+import os
+from basicio import io
+
+__all__ = ['Schema']
+
+# attributes of a schema, in the order in which they are stored
+_fields = ('names', 'types', 'delimiter', 'datastring', 'headerstring',
+           'ignorestring')
+
+# default values of the optional attributes of a schema
+_defaults = dict(delimiter='', datastring=None, headerstring=None,
+                 ignorestring=None)
+
+
+class Schema(object):
+    """
+    The layout of a family of tables: the names and types of the columns,
+    the delimiter, and the strings starting lines of data, header lines and
+    comments. A schema is inferred once from a file, and then given to
+    `basicio.io.file2recarray` to read files of the same layout without
+    guessing types or reading names from headers, checking every row
+    against it.
+
+
+    Parameters
+    ----------
+    names: list of strings, mandatory
+        names of the columns
+    types: list of variable types, mandatory
+        types of the columns, eg. 'i8', 'f4', 'a20'
+    delimiter, datastring, headerstring, ignorestring: optional
+        as in `basicio.io.file2recarray`
+
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> fname = os.path.join(io._here, 'example_data/singleheader_data.dat')
+    >>> schema = Schema.infer(fname, headerstring='#')
+    >>> schema
+    Schema(names=['SNID', 'z', 'mu'], types=['<i8', '<f4', '<f4'], \
+headerstring='#')
+    >>> fd, schemafile = tempfile.mkstemp(suffix='.json')
+    >>> os.close(fd)
+    >>> schema.save(schemafile)
+    >>> Schema.load(schemafile) == schema
+    True
+    >>> os.remove(schemafile)
+    >>> schema.read(fname)
+    array([(23, 1. , 45.), (12, 0.6, 41.)],
+          dtype=[('SNID', '<i8'), ('z', '<f4'), ('mu', '<f4')])
+    >>> schema.read('# SNID z mu\\n23 1.0 45\\n03D1ba 0.6 41\\n', buffer=True)
+    Traceback (most recent call last):
+        ...
+    ValueError: Row 1 of the data does not fit the schema: '03D1ba' is not \
+a value of type <i8 for the field SNID
+    >>> notes = Schema(['SNID', 'z'], ['i8', 'f4'], ignorestring='!')
+    >>> notes.read('1 0.5 ! first\\n2 0.7\\n', buffer=True)
+    array([(1, 0.5), (2, 0.7)], dtype=[('SNID', '<i8'), ('z', '<f4')])
+    """
+    def __init__(self, names, types, delimiter='', datastring=None,
+                 headerstring=None, ignorestring=None):
+        if len(names) != len(types):
+            raise ValueError('A schema must have as many names as types')
+        self.names = list(names)
+        self.types = [np.dtype(t).str for t in types]
+        self.delimiter = delimiter
+        self.datastring = datastring
+        self.headerstring = headerstring
+        self.ignorestring = ignorestring
+
+    @property
+    def dtype(self):
+        """
+        dtype of the tables of the schema
+        """
+        return np.format_parser(formats=self.types, names=self.names,
+                                titles=None).dtype
+
+    def __eq__(self, other):
+        return (isinstance(other, Schema) and
+                all(getattr(self, name) == getattr(other, name)
+                    for name in _fields))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        items = ['{}={!r}'.format(name, getattr(self, name))
+                 for name in _fields
+                 if name not in _defaults or
+                 getattr(self, name) != _defaults[name]]
+        return 'Schema({})'.format(', '.join(items))
+
+    @classmethod
+    def infer(cls, file, delimiter='', datastring=None, headerstring=None,
+              ignorestring=None, buffer=False, names=None, sample=None,
+              exactstrings=False, compact=False):
+        """
+        returns the schema of the table in a file or buffer, with the names
+        and types of its columns as read by `basicio.io.file2recarray` with
+        the same arguments, from sample rows if sample is not `None`
+
+
+        Parameters
+        ----------
+        file: string or buffer, mandatory
+            absolute path to file containing the data, or a string or buffer
+            containing the data if buffer is True
+        delimiter, datastring, headerstring, ignorestring, buffer, names,
+        sample, exactstrings, compact: optional
+            as in `basicio.io.file2recarray` . Since other files of the
+            schema may have longer strings, or wider ranges of numbers,
+            exactstrings and compact are best used with a sample which is
+            representative of all the files.
+        """
+        dtype = io.file2recarray(file, names=names, delimiter=delimiter,
+                                 headerstring=headerstring,
+                                 ignorestring=ignorestring,
+                                 datastring=datastring, buffer=buffer,
+                                 sample=sample, exactstrings=exactstrings,
+                                 compact=compact).dtype
+        return cls(list(dtype.names),
+                   [dtype[i].str for i in range(len(dtype))],
+                   delimiter=delimiter, datastring=datastring,
+                   headerstring=headerstring, ignorestring=ignorestring)
+
+    def todict(self):
+        """
+        returns the schema as a dictionary of its attributes
+        """
+        return dict((name, getattr(self, name)) for name in _fields)
+
+    @classmethod
+    def fromdict(cls, schema):
+        """
+        returns the schema of the dictionary of attributes schema, as given
+        by `todict`
+        """
+        # json gives unicode strings
+        schema = dict((str(key), str(value)
+                       if isinstance(value, unicode) else value)
+                      for key, value in schema.iteritems())
+        for key in ('names', 'types'):
+            schema[key] = [str(value) for value in schema[key]]
+        return cls(**schema)
+
+    def save(self, fname):
+        """
+        saves the schema to the JSON file fname
+        """
+        with open(fname, 'w') as fp:
+            json.dump(self.todict(), fp, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, fname):
+        """
+        returns the schema saved to the JSON file fname by `save`
+        """
+        with open(fname) as fp:
+            return cls.fromdict(json.load(fp))
+
+    def read(self, file, **kwargs):
+        """
+        returns the table in a file or buffer read by
+        `basicio.io.file2recarray` with this schema and the keyword arguments
+        kwargs
+        """
+        return io.file2recarray(file, schema=self, **kwargs)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+import numpy as np
+import itertools
+import os
+from basicio import instrument
+from basicio import io
+from basicio import utils
+
+__all__ = ['TableTail']
+
+
+class TableTail(object):
+    """
+    A reader of the tabular data in a file to which lines are appended, as
+    by a job writing its results, which remembers how far it has read the
+    file, and the types and names of the fields, so that each refresh only
+    parses the complete lines appended since the previous one. A last line
+    which has no newline yet is left for the next refresh. If the file
+    becomes shorter than what has been read, or is replaced by another file,
+    it is read again from the start. Lines of data must all have the number
+    of columns of the first one, and a refresh finding one that does not
+    raises a ValueError, leaving the lines it read to be read again.
+
+
+    Parameters
+    ----------
+    fname: string, mandatory
+        absolute path to the file containing the data, which must not be
+        compressed
+    types: list of variable types, optional, defaults to `None`
+        types of variables corresponding to the columns read. If `None` ,
+        these are guessed from the lines of data read by the first refresh
+        finding any, and promoted if later lines have values which do not fit
+        them, converting the rows read so far.
+    names, titles, delimiter, headerstring, ignorestring, datastring, usecols:
+    optional
+        as in `basicio.io.file2recarray` . Header lines must precede the
+        data.
+
+
+    Attributes
+    ----------
+    offset: int
+        number of bytes of the file read so far
+    dtype: `np.dtype`
+        dtype of the table, or `None` until lines of data have been read
+    headers: list of lists of strings
+        variable names on the header lines read so far
+    numrows: int
+        number of rows read so far
+
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> fd, fname = tempfile.mkstemp()
+    >>> with os.fdopen(fd, 'w') as fp:
+    ...     fp.write('# SNID z\\n1 0.5\\n2 0.7\\n3 0.')
+    >>> tail = TableTail(fname, headerstring='#')
+    >>> tail.refresh()
+    array([(1, 0.5), (2, 0.7)], dtype=[('SNID', '<i8'), ('z', '<f4')])
+    >>> with open(fname, 'a') as fp:
+    ...     fp.write('9\\n04D1la 1.1\\n')
+    >>> tail.refresh()['SNID']
+    array(['3', '04D1la'], dtype='|S20')
+    >>> tail.refresh()
+    array([], dtype=[('SNID', 'S20'), ('z', '<f4')])
+    >>> tail.table['SNID']
+    array(['1', '2', '3', '04D1la'], dtype='|S20')
+    >>> tail.offset == os.path.getsize(fname)
+    True
+    >>> with open(fname, 'a') as fp:
+    ...     fp.write('5\\n')
+    >>> tail.refresh()
+    Traceback (most recent call last):
+        ...
+    ValueError: The data has an inconsistent number of columns: row 0 has 1 \
+values rather than 2
+    >>> tail.offset == os.path.getsize(fname) - 2
+    True
+    >>> os.remove(fname)
+    """
+    def __init__(self, fname, types=None, names=None, titles=None,
+                 delimiter='', headerstring=None, ignorestring=None,
+                 datastring=None, usecols=None):
+        if io._filecompression(fname) is not None:
+            raise ValueError('Compressed files cannot be read incrementally')
+        self.fname = fname
+        self.types = types
+        self.names = names
+        self.titles = titles
+        self.delimiter = delimiter
+        self.headerstring = headerstring
+        self.ignorestring = ignorestring
+        self.datastring = datastring
+        self.usecols = usecols
+        self.reset()
+
+    def reset(self):
+        """
+        forgets the data read so far, so that the next refresh reads the file
+        from the start
+        """
+        self.offset = 0
+        self.dtype = None
+        self.headers = []
+        self.numrows = 0
+
+        # names of the fields, indices of the columns read and number of
+        # columns of every line, known once the first line of data is read
+        self._fieldnames = None
+        self._usecols = None
+        self._numcols = None
+        self._started = False
+        self._inode = None
+
+        # rows read so far, at the start of an array grown by doubling so
+        # that appending rows costs a copy of the new rows only
+        self._buffer = None
+
+    @property
+    def table(self):
+        """
+        structured array of all the rows read so far, or `None` until lines
+        of data have been read. This is a view which is not updated by later
+        refreshes.
+        """
+        if self._buffer is None:
+            return None
+        return self._buffer[:self.numrows]
+
+    def _completelines(self, fp):
+        """
+        generator yielding the complete lines of the open file fp, from the
+        offset, and moving the offset past them
+        """
+        for line in fp:
+            if not line.endswith('\n'):
+                return
+            self.offset += len(line)
+            yield line
+
+    def _convert(self, blocks):
+        """
+        returns the structured array of the list of blocks of columns of
+        strings, fixing the dtype if it is not known yet, or promoting it if
+        the types are guessed and the blocks have values which do not fit it
+        """
+        if self.dtype is None:
+            chunk = io._blocks2recarray(blocks, names=self._fieldnames,
+                                        types=self.types, titles=self.titles)
+            self.dtype = chunk.dtype
+            return chunk
+
+        types = [self.dtype[i].str for i in range(len(self.dtype))]
+        try:
+            # the columns of blocks are released as they are copied, and
+            # are kept for a second attempt
+            return io._blocks2recarray([list(block) for block in blocks],
+                                       names=self._fieldnames, types=types,
+                                       titles=self.titles)
+        except ValueError:
+            if self.types is not None:
+                raise
+        with instrument.phase('infer'):
+            types = [utils.promotetypes([t] + [utils.guessarraytype(block[i])
+                                               for block in blocks])
+                     for i, t in enumerate(types)]
+        chunk = io._blocks2recarray(blocks, names=self._fieldnames,
+                                    types=types, titles=self.titles)
+        self.dtype = chunk.dtype
+        if self._buffer is not None:
+            with instrument.phase('convert'):
+                self._buffer = self._buffer.astype(self.dtype)
+        return chunk
+
+    def _append(self, chunk):
+        """
+        appends the structured array chunk to the rows read so far
+        """
+        numrows = self.numrows + len(chunk)
+        if self._buffer is None or len(self._buffer) < numrows:
+            with instrument.phase('assemble'):
+                size = numrows
+                if self._buffer is not None:
+                    size = max(numrows, 2 * len(self._buffer))
+                buf = np.empty(size, dtype=self.dtype)
+                buf[:self.numrows] = self.table
+                self._buffer = buf
+        self._buffer[self.numrows:numrows] = chunk
+        self.numrows = numrows
+
+    def refresh(self):
+        """
+        reads the complete lines appended to the file since the previous
+        refresh, and returns their rows
+
+
+        Returns
+        -------
+        structured array of the rows read, which has no rows if no lines of
+        data were appended, or `None` if no lines of data have been read yet.
+        The rows read so far are `table` .
+        """
+        with open(self.fname, 'rb') as fp:
+            stat = os.fstat(fp.fileno())
+            if stat.st_size < self.offset or (self._inode is not None and
+                                              stat.st_ino != self._inode):
+                self.reset()
+            self._inode = stat.st_ino
+            fp.seek(self.offset)
+
+            # Header lines are only collected until the first line of data
+            started = self._started
+            headers = None if started else list(self.headers)
+            lines = self._completelines(fp)
+            offset = self.offset
+            try:
+                tokens = io._datatokens(lines, delimitter=self.delimiter,
+                                        datastring=self.datastring,
+                                        ignorestring=self.ignorestring,
+                                        headerstring=self.headerstring,
+                                        headers=headers)
+                if not started:
+                    first = next(tokens, None)
+                    if first is None:
+                        self.headers = headers
+                        return None
+                    tokens = itertools.chain([first], tokens)
+                    self._numcols = len(first)
+                    useheaders = self.headerstring is not None and (
+                        self.names is None or self.usecols is not None)
+                    self._fieldnames, self._usecols = io._selectnames(
+                        headers, self.names, self.usecols,
+                        useheaders=useheaders)
+                blocks = list(io._columnblocks(tokens, usecols=self._usecols,
+                                               numcols=self._numcols))
+                if len(blocks) == 0:
+                    return np.empty(0, dtype=self.dtype)
+                chunk = self._convert(blocks)
+            except Exception:
+                # the lines are read again by the next refresh
+                self.offset = offset
+                raise
+        if not started:
+            self.headers = headers
+            self._started = True
+        self._append(chunk)
+        instrument.add(counts=dict(rows=len(chunk)))
+        return chunk
@@ -1,10 +1,31 @@
 #!/usr/bin/env python
 
 import numpy as np
+import os
 import sys
+from basicio import instrument
 # import string
 
-__all__ = ['tokenizeline', 'guesstype', 'guessarraytype']
+__all__ = ['tokenizeline', 'guesstype', 'guessarraytype', 'promotetypes',
+           'castarray']
+
+# types guessed from strings, in increasing order of generality
+_typeorder = ('i8', 'f4', 'a20')
+
+# the type in _typeorder of each kind of numpy type
+_basetypes = {'i': 'i8', 'u': 'i8', 'f': 'f4', 'S': 'a20', 'U': 'a20'}
+
+# classes of the bytes of strings of integers: 0 for bytes which cannot be
+# in them, 1 for whitespace and the padding of numpy strings, 2 for digits
+# and 3 for signs
+_intbytes = np.zeros(256, dtype=np.uint8)
+_intbytes[[ord(c) for c in ' \t\n\r\v\f\0']] = 1
+_intbytes[ord('0'):ord('9') + 1] = 2
+_intbytes[[ord('+'), ord('-')]] = 3
+
+# indices of the parameter files read by builddict with cache True, by path,
+# ignorestrings and dictdelim
+_dictindices = {}
 
 
 def tokenizeline(line, delimitter="", ignorestrings="#", prependstring=None,
@@ -131,7 +152,108 @@ def guesstype(s, makeintfloats=False):
     return "a20", s
 
 
-def guessarraytype(arr, makeintfloats=False):
+def _isintarray(arr):
+    """
+    returns True if all the strings in the `np.ndarray` arr can be converted
+    with `int` , ie. they are made of decimal digits with at most one leading
+    sign, and possibly surrounded by whitespace. The bytes of arrays of byte
+    strings are first looked up in `_intbytes` , so that most arrays which
+    are not integers are rejected by a single pass, and the others are
+    checked for a single run of digits per string, preceded by at most one
+    sign.
+
+    .. note:: This is checked with character class masks rather than \
+    `np.ndarray.astype` , since the conversion of strings to integers in \
+    numpy does not always raise errors for strings that are not integers.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind == 'S':
+        if arr.size == 0:
+            return True
+        if arr.dtype.itemsize == 0:
+            return False
+        codes = _intbytes[np.ascontiguousarray(arr).view(np.uint8)]
+        codes = codes.reshape(arr.size, arr.dtype.itemsize)
+        if not codes.all():
+            return False
+        digits = codes == 2
+        runs = digits[:, 0] + (digits[:, 1:] & ~digits[:, :-1]).sum(axis=1)
+        if not (runs == 1).all():
+            return False
+        signs = codes == 3
+        if not signs.any():
+            return True
+        # a sign must come right before the digits
+        return not (signs[:, -1].any() or
+                    (signs[:, :-1] & ~digits[:, 1:]).any())
+    arr = np.char.strip(arr)
+    unsigned = np.char.lstrip(arr, '+-')
+    numsigns = np.char.str_len(arr) - np.char.str_len(unsigned)
+    return bool(((numsigns <= 1) & np.char.isdigit(unsigned)).all())
+
+
+def _guessblocktype(block, makeintfloats=False, isfloat=False):
+    """
+    guess the type (out of 'i8', 'f4', 'a20') of a 1D `np.ndarray` of strings
+    by checking the entire block at once, rather than calling `guesstype` on
+    each element. If isfloat is True, the block is already known not to be a
+    column of integers, and this is not checked. Since strings of integers
+    are numbers, the block is only checked for integers if it converts to
+    floats.
+    """
+    try:
+        block.astype(np.float64)
+    except ValueError:
+        return 'a20'
+    if not isfloat and _isintarray(block):
+        if makeintfloats:
+            return 'f4'
+        return 'i8'
+    return 'f4'
+
+
+def castarray(arr, dtype, checked=False):
+    """
+    converts an array of strings to the type dtype, raising a ValueError if
+    any of the strings cannot be converted
+
+
+    Parameters
+    ----------
+    arr: `np.ndarray` of strings, mandatory
+        strings to convert
+    dtype: `np.dtype` or string, mandatory
+        type of the converted array
+    checked: bool, optional, defaults to False
+        if True, the strings are known to be values of dtype, eg. as the type
+        guessed from them by `guessarraytype` , and are converted without
+        checking them
+
+
+    Returns
+    -------
+    `np.ndarray` of type dtype
+
+
+    Examples
+    --------
+    >>> castarray(np.array(['3', '-2', '+4']), 'i8')
+    array([ 3, -2,  4])
+    >>> castarray(np.array(['3', '2.5'] * 5000), 'i8')
+    Traceback (most recent call last):
+        ...
+    ValueError: Strings in the array cannot be converted to i8
+    """
+    dtype = np.dtype(dtype)
+    with instrument.phase('convert'):
+        if (not checked and dtype.kind in 'iu' and arr.dtype.kind in 'SU' and
+                not _isintarray(arr)):
+            raise ValueError('Strings in the array cannot be converted to '
+                             '{}'.format(dtype.str[1:]))
+        return arr.astype(dtype, copy=False)
+
+
+def guessarraytype(arr, makeintfloats=False, blocksize=65536):
     """
     guess the underlying datatype (out of 'i8', 'f4', 'a20') of an iterable
     of strings. If the iterable contains strings that are guessed to be of
@@ -146,6 +268,10 @@ def guessarraytype(arr, makeintfloats=False):
     makeintfloats: optional, bool, defaults to False
         If true, assumes that strings that can be integers are actually
         floats, so that strings like '3' are treated as '3.0'
+    blocksize: int, optional, defaults to 65536
+        number of elements whose type is guessed with a single vectorized
+        conversion. Blocks are examined in order, and no further blocks are
+        examined once a string is found.
 
 
     Returns
@@ -170,19 +296,68 @@ def guessarraytype(arr, makeintfloats=False):
     >>> arr = ['3.4', '2.7', '4.0', 's23']
     >>> guessarraytype(arr)
     'a20'
+    >>> guessarraytype(['3', '2', '4.0', 's23', '2'], blocksize=2)
+    'a20'
+
+
+    .. note:: The whole column is checked a block at a time, with character \
+    class masks for integers and `np.ndarray.astype` for floats, which gives \
+    the same decisions as `guesstype` on each element.
     """
-    typearr = np.array(map(lambda x: guesstype(x,
-                       makeintfloats=makeintfloats)[0], arr))
-    if any(typearr == 'a20'):
-        return 'a20'
-    elif any(typearr == 'f4'):
-        return 'f4'
-    elif all(typearr == 'i8'):
+    with instrument.phase('infer'):
+        arr = np.asarray(arr).ravel()
+        if len(arr) == 0:
+            return 'i8'
+
+        isfloat = False
+        for start in range(0, len(arr), blocksize):
+            t = _guessblocktype(arr[start:start + blocksize],
+                                makeintfloats=makeintfloats, isfloat=isfloat)
+            if t == 'a20':
+                # The column is a string column, nothing more to check
+                return 'a20'
+            isfloat = t == 'f4'
+        if isfloat:
+            return 'f4'
         return 'i8'
-    else:
-        raise ValueError('It seems that guesstype is not finding one of \
-            \'f4\', \'i8\' or \'a20\' as the types of all elements in arr')
-        sys.exit()
+
+
+def promotetypes(types):
+    """
+    returns the most general of a collection of types guessed from strings,
+    where integers, floats and strings ('i8', 'f4', 'a20') are in increasing
+    order of generality. This is the type that `guessarraytype` would return
+    for the union of the arrays whose types are given. Among types of the
+    same kind, the widest is returned.
+
+
+    Parameters
+    ----------
+    types: iterable of strings, mandatory
+        types of integers, floats or strings, eg. 'i8', 'f4', 'a20', 'a6'
+
+
+    Returns
+    -------
+    One of types
+
+
+    Examples
+    --------
+    >>> promotetypes(['i8', 'f4', 'i8'])
+    'f4'
+    >>> promotetypes(['i8', 'a20', 'f4'])
+    'a20'
+    >>> promotetypes(['i8'])
+    'i8'
+    >>> promotetypes(['a6', 'i8', 'a11'])
+    'a11'
+    """
+    types = list(types)
+    kinds = [_typeorder.index(_basetypes[np.dtype(t).kind]) for t in types]
+    kind = max(kinds)
+    return max([t for t, k in zip(types, kinds) if k == kind],
+               key=lambda t: np.dtype(t).itemsize)
 
 
 def _tokenizeline(line, delimstrings=" ", ignorestrings=["#"]):
@@ -267,11 +442,77 @@ def _tokenizeline(line, delimstrings=" ", ignorestrings=["#"]):
     ret = ( tokens , comments)
     return ret
 
+def _dictindex(fname, ignorestrings, dictdelim):
+    """
+    returns the index of the parameter file fname used by `builddict` with
+    cache True, scanning the file only if it has not been indexed since it
+    was last modified. The index is a dictionary of the list of 'lines' of
+    the file, the list of the (key, value) pairs on them, or `None` for
+    lines without a pair, and the dictionaries of the 'blocks' already
+    requested by (startblock, endblock).
+    """
+    key = (os.path.realpath(fname), tuple(ignorestrings), dictdelim)
+    stat = os.stat(fname)
+    version = (stat.st_size, stat.st_mtime)
+    index = _dictindices.get(key)
+    if index is not None and index['version'] == version:
+        return index
+    with open(fname, 'r') as f:
+        lines = f.readlines()
+    pairs = []
+    for line in lines:
+        tmp = _tokenizeline(line, ignorestrings=ignorestrings,
+                            delimstrings=dictdelim)[0]
+        if len(tmp) > 1:
+            pairs.append((str(tmp[0].strip()), str(tmp[1].strip())))
+        else:
+            pairs.append(None)
+    index = dict(version=version, lines=lines, pairs=pairs, blocks={})
+    _dictindices[key] = index
+    return index
+
+
+def _blockdict(index, startblock=None, endblock=None):
+    """
+    returns the dictionary of the keys and values in the blocks of lines
+    between startblock and endblock of a file indexed by `_dictindex` ,
+    selected by the same rules as `builddict`
+    """
+    lines = index['lines']
+    pairs = index['pairs']
+    paramdict = {}
+    readin = False
+    i = 0
+    while i < len(lines):
+        if startblock:
+            if not readin and lines[i].find(startblock) != -1:
+                readin = True
+        else:
+            readin = True
+        if not readin:
+            i += 1
+            continue
+        if pairs[i] is not None:
+            paramdict[pairs[i][0]] = pairs[i][1]
+        i += 1
+        if endblock and i < len(lines) and lines[i].find(endblock) != -1:
+            readin = False
+    return paramdict
+
+
+def cleardictcache():
+    """
+    forgets the parameter files indexed by `builddict` with cache True
+    """
+    _dictindices.clear()
+
+
 def builddict(fname,
     ignorestrings=['#'],
     dictdelim='=',
     startblock = None, 
-    endblock =None):
+    endblock =None,
+    cache=False):
 
     """builddict (fname) reads in the file with filename
     fname, and builds a dictionary of keys vs values from
@@ -293,6 +534,13 @@ def builddict(fname,
             Can do a replace within only the starting and ending
             blocks but both must be provided. These blocks can 
             start with a comment string 
+        cache: optional, bool, defaults to False
+            if True, the file is scanned once into an index of the
+            key, value pairs on its lines, which is kept in memory 
+            until the file is modified, and the dictionary of each 
+            block is kept after it is first built, so that later 
+            calls for the same file do not read it again. 
+            `cleardictcache` forgets the indices.
     returns:
         dictionary of keys and values (in strings)
     example usage :
@@ -303,7 +551,29 @@ def builddict(fname,
         That was in configdict. Rewritten to use ioutilst, not tested 
         yet,
         R. Biswas, Aug 09, 2012
+
+    >>> import tempfile
+    >>> fd, fname = tempfile.mkstemp()
+    >>> with os.fdopen(fd, 'w') as fp:
+    ...     fp.write('a = 1 # comment\\n[camb]\\nh = 0.7\\n[end]\\nb = 2\\n')
+    >>> builddict(fname) == builddict(fname, cache=True)
+    True
+    >>> builddict(fname, startblock='[camb]', endblock='[end]', cache=True)
+    {'h': '0.7'}
+    >>> with open(fname, 'a') as fp:
+    ...     fp.write('c = 3\\n')
+    >>> sorted(builddict(fname, cache=True).items())
+    [('a', '1'), ('b', '2'), ('c', '3'), ('h', '0.7')]
+    >>> os.remove(fname)
     """
+    if cache:
+        index = _dictindex(fname, ignorestrings, dictdelim)
+        block = (startblock, endblock)
+        if block not in index['blocks']:
+            index['blocks'][block] = _blockdict(index, startblock=startblock,
+                                                endblock=endblock)
+        # copied so that the dictionary kept is not changed by the caller
+        return dict(index['blocks'][block])
     f = open(fname, "r")
     line = f.readline()
     i = 0
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+generators of synthetic tables shaped like the table of
+`basicio/example_data/table_data.dat` , and of parameter files for
+`basicio.utils.builddict` , for the benchmarks
+"""
+
+import numpy as np
+import collections
+import os
+import shutil
+from basicio import io
+
+__all__ = ['tablecolumns', 'writetable', 'writedict']
+
+# names of the columns of the synthetic tables
+names = ['SNID'] + ['v{}'.format(i) for i in range(1, 27)]
+
+# columns of integers of table_data.dat, the others after the first being
+# floats
+_intcols = (17, 22, 23)
+
+
+def tablecolumns(numrows, seed=0):
+    """
+    returns an ordered dictionary of the columns of a synthetic table of
+    numrows rows with the types of the columns of table_data.dat: an
+    identifier which is a string or an integer, floats written with various
+    precisions and exponents, and integers
+    """
+    rng = np.random.RandomState(seed)
+    columns = collections.OrderedDict()
+
+    # identifiers like 6773 and 03D3ba, so that the column has strings
+    ids = rng.randint(1000, 100000, size=numrows).astype('S6')
+    named = rng.rand(numrows) < 0.8
+    fields = ['0{}D{}{}'.format(rng.randint(3, 7), rng.randint(1, 5), suffix)
+              for suffix in ('ba', 'ow', 'nq', 'em', 'al', 'qd', 'hn')]
+    ids[named] = np.array(fields)[rng.randint(0, len(fields),
+                                              size=named.sum())]
+    columns[names[0]] = ids
+
+    for i in range(1, 27):
+        if i in _intcols:
+            columns[names[i]] = rng.randint(0, 500, size=numrows)
+        elif i % 4 == 3:
+            # small values written with exponents
+            columns[names[i]] = (rng.randn(numrows) *
+                                 10.0 ** rng.randint(-9, -3, size=numrows))
+        elif i == 9:
+            # dates like 53678.492188
+            columns[names[i]] = np.round(52000 + 2000 * rng.rand(numrows),
+                                         6)
+        else:
+            columns[names[i]] = np.round(rng.randn(numrows), 6)
+    return columns
+
+
+def writetable(fname, numrows, datastring=None, header=None, seed=0,
+               numeric=False):
+    """
+    writes a synthetic table of numrows rows given by `tablecolumns` to the
+    file fname, with every line of data starting with datastring if it is
+    not `None` . If header is 'single' , the names of the columns are on a
+    header line starting with '#' , and if header is 'multi' , they are
+    split over three header lines starting with '@' . If numeric is True,
+    the column of identifiers is left out, so that the table only has
+    numbers.
+    """
+    columns = tablecolumns(numrows, seed=seed)
+    if numeric:
+        del columns[names[0]]
+    if header == 'single':
+        io.recarray2file(columns, fname, headerstring='#',
+                         datastring=datastring)
+        return
+    io.recarray2file(columns, fname + '.tmp', datastring=datastring)
+    with open(fname, 'wb') as fp:
+        if header == 'multi':
+            for start in range(0, len(names), 9):
+                fp.write('@ ' + ' '.join(names[start:start + 9]) + '\n')
+        with open(fname + '.tmp', 'rb') as data:
+            shutil.copyfileobj(data, fp)
+    os.remove(fname + '.tmp')
+
+
+def writedict(fname, numkeys, seed=0):
+    """
+    writes a file of numkeys lines 'key = value' , with comments, to fname
+    """
+    rng = np.random.RandomState(seed)
+    values = rng.rand(numkeys)
+    with open(fname, 'wb') as fp:
+        fp.write('# synthetic parameters\n')
+        for i, value in enumerate(values):
+            fp.write('param{} = {!r} # comment\n'.format(i, value))
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+benchmarks of the public entry points of basicio on synthetic tables, with
+`numpy.loadtxt` and `numpy.genfromtxt` as baselines. Each measurement runs
+in a process of its own, so that the peak memory of one does not hide
+another. The results are stored as JSON, to be compared between versions.
+
+Usage::
+
+    python benchmarks/run.py --rows 1e3 1e5 --output results/v1.json
+    python benchmarks/run.py --compare results/v1.json results/v2.json
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from basicio import instrument, io, utils
+from basicio.schema import Schema
+import generate
+
+
+def _plain(files):
+    return files['plain']
+
+
+def _strarray(files):
+    return io.file2strarray(files['plain'])
+
+
+def _recarray(files):
+    return io.file2recarray(files['plain'])
+
+
+# benchmarks as tuples (name, setup, func): setup is called with the paths
+# of the synthetic files by kind, outside of the timed part, and func is timed
+# on what it returns
+cases = [
+    ('file2strarray', _plain, io.file2strarray),
+    ('arraydtypes', _strarray, io.arraydtypes),
+    ('strarray2recarray', _strarray, io.strarray2recarray),
+    ('file2recarray', _plain, io.file2recarray),
+    ('file2recarray numeric', lambda files: files['numeric'],
+     io.file2recarray),
+    ('file2recarray numeric=False', lambda files: files['numeric'],
+     lambda fname: io.file2recarray(fname, numeric=False)),
+    ('file2recarray schema',
+     lambda files: (files['plain'], Schema.infer(files['plain'])),
+     lambda args: args[1].read(args[0])),
+    ('file2recarray sample', _plain,
+     lambda fname: io.file2recarray(fname, sample=1000)),
+    ('file2recarray datastring', lambda files: files['datastring'],
+     lambda fname: io.file2recarray(fname, datastring='SN:')),
+    ('file2recarray header', lambda files: files['single'],
+     lambda fname: io.file2recarray(fname, headerstring='#')),
+    ('file2recarray multiheader', lambda files: files['multi'],
+     lambda fname: io.file2recarray(fname, headerstring='@',
+                                    names=generate.names)),
+    ('getheaders', lambda files: files['single'],
+     lambda fname: io.getheaders(fname, '#')),
+    ('getheaders multiheader', lambda files: files['multi'],
+     lambda fname: io.getheaders(fname, '@', singleheader=False)),
+    ('builddict', lambda files: files['dict'], utils.builddict),
+    ('builddict cached', lambda files: files['dict'],
+     lambda fname: utils.builddict(fname, cache=True)),
+    ('loadfile2array', _plain, utils.loadfile2array),
+    ('numpy.loadtxt', lambda files: (files['plain'], _recarray(files).dtype),
+     lambda args: np.loadtxt(args[0], dtype=args[1])),
+    ('numpy.genfromtxt', _plain,
+     lambda fname: np.genfromtxt(fname, dtype=None)),
+]
+
+# reasons for which benchmarks of cases are not run, by name, recorded in the
+# results instead of their measurements
+skipped = {
+    'loadfile2array': 'loadfile2array passes delimstrings, which '
+                      'tokenizeline does not take, so it fails on any line '
+                      'of data',
+}
+
+
+def writefiles(directory, numrows):
+    """
+    writes the synthetic files of numrows rows used by the benchmarks to
+    directory, unless they exist, and returns their paths by kind
+    """
+    files = {}
+    for kind, kwargs in [('plain', {}), ('datastring', dict(datastring='SN:')),
+                         ('single', dict(header='single')),
+                         ('multi', dict(header='multi')),
+                         ('numeric', dict(numeric=True))]:
+        files[kind] = os.path.join(directory,
+                                   '{}_{}.dat'.format(kind, numrows))
+        if not os.path.exists(files[kind]):
+            generate.writetable(files[kind], numrows, **kwargs)
+    files['dict'] = os.path.join(directory, 'dict_{}.ini'.format(numrows))
+    if not os.path.exists(files['dict']):
+        generate.writedict(files['dict'], numrows)
+    return files
+
+
+def _measure(args):
+    """
+    runs a benchmark in a process of the pool, and returns the dictionary of
+    its results: the best time of repeat runs, and the peak memory and the
+    statistics of `basicio.instrument` of the first run
+    """
+    index, files, repeat = args
+    name, setup, func = cases[index]
+    result = dict(name=name)
+    try:
+        arg = setup(files)
+        before = instrument._peakmemory()
+        with instrument.collect() as stats:
+            func(arg)
+        if before is not None:
+            result['peakincrease'] = instrument._peakmemory() - before
+        result['phases'] = stats.times
+        times = [stats.elapsed]
+        for i in range(repeat - 1):
+            start = time.time()
+            func(arg)
+            times.append(time.time() - start)
+        result['seconds'] = min(times)
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    return result
+
+
+def run(sizes, repeat=3, datadir=None, names=None):
+    """
+    returns the list of the results of the benchmarks whose names are in
+    names, or all of them, on tables of each number of rows in sizes
+    """
+    keep = datadir is not None
+    if datadir is None:
+        datadir = tempfile.mkdtemp()
+    elif not os.path.isdir(datadir):
+        os.makedirs(datadir)
+    results = []
+    try:
+        for numrows in sizes:
+            files = writefiles(datadir, numrows)
+            for index, case in enumerate(cases):
+                if names is not None and case[0] not in names:
+                    continue
+                if case[0] in skipped:
+                    result = dict(name=case[0], rows=numrows,
+                                  skipped=skipped[case[0]])
+                    results.append(result)
+                    _printresult(result)
+                    continue
+
+                # a fresh process for each benchmark
+                pool = multiprocessing.Pool(1, maxtasksperchild=1)
+                try:
+                    result = pool.apply(_measure, ((index, files, repeat),))
+                finally:
+                    pool.close()
+                    pool.join()
+                result['rows'] = numrows
+                if 'seconds' in result and result['seconds'] > 0:
+                    result['rowspersecond'] = numrows / result['seconds']
+                results.append(result)
+                _printresult(result)
+    finally:
+        if not keep:
+            shutil.rmtree(datadir)
+    return results
+
+
+def _printresult(result):
+    if 'skipped' in result:
+        print '{:<28s} {:>9d} rows  skipped: {}'.format(
+            result['name'], result['rows'], result['skipped'])
+        return
+    if 'error' in result:
+        print '{:<28s} {:>9d} rows  failed: {}'.format(
+            result['name'], result['rows'], result['error'])
+        return
+    memory = ''
+    if 'peakincrease' in result:
+        memory = '{:8.1f} MB'.format(result['peakincrease'] / 2. ** 20)
+    print '{:<28s} {:>9d} rows {:10.4f} s {:12.0f} rows/s {}'.format(
+        result['name'], result['rows'], result['seconds'],
+        result['rowspersecond'], memory)
+
+
+def save(results, fname, label=None):
+    """
+    saves the results with a description of the environment to the JSON
+    file fname
+    """
+    directory = os.path.dirname(os.path.abspath(fname))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(fname, 'w') as fp:
+        json.dump(dict(label=label, date=datetime.datetime.now().isoformat(),
+                       python=platform.python_version(),
+                       numpy=np.__version__, platform=platform.platform(),
+                       results=results), fp, indent=1, sort_keys=True)
+
+
+def compare(oldfile, newfile, tolerance=0.1):
+    """
+    prints the ratios of the times of the benchmarks in the JSON files
+    newfile and oldfile, flagging those slower by more than tolerance, and
+    returns the number of such regressions
+    """
+    with open(oldfile) as fp:
+        old = json.load(fp)
+    with open(newfile) as fp:
+        new = json.load(fp)
+    before = dict(((r['name'], r['rows']), r) for r in old['results']
+                  if 'seconds' in r)
+    regressions = 0
+    for result in new['results']:
+        key = (result['name'], result['rows'])
+        if 'seconds' not in result or key not in before:
+            continue
+        ratio = result['seconds'] / before[key]['seconds']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = 'SLOWER'
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            flag = 'faster'
+        print '{:<28s} {:>9d} rows {:8.2f}x {}'.format(key[0], key[1], ratio,
+                                                       flag)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=float, nargs='+',
+                        default=[1e3, 1e4, 1e5],
+                        help='numbers of rows of the tables, up to 1e7')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each benchmark')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='names of the only benchmarks to run')
+    parser.add_argument('--datadir', default=None,
+                        help='directory in which the synthetic tables are '
+                        'kept between runs')
+    parser.add_argument('--output', default=None,
+                        help='JSON file in which the results are stored')
+    parser.add_argument('--label', default=None,
+                        help='label of the results, eg. a version')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare the results in two JSON files')
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        return compare(*args.compare) > 0
+    results = run([int(n) for n in args.rows], repeat=args.repeat,
+                  datadir=args.datadir, names=args.only)
+    if args.output is not None:
+        save(results, args.output, label=args.label)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())